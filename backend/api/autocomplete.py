@@ -0,0 +1,49 @@
+from bisect import bisect_left
+
+from recipes.catalogs import get_version
+from recipes.models import Ingredient
+
+_index = None
+
+
+class PrefixIndex:
+    """Case-folded sorted names answering ranked autocomplete queries"""
+
+    def __init__(self, items):
+        entries = sorted((name.casefold(), pk) for pk, name in items)
+        self.names = [name for name, _ in entries]
+        self.ids = [pk for _, pk in entries]
+
+    def search(self, query, limit):
+        """Ids ranked as exact match > prefix match > substring match"""
+        query = query.casefold().strip()
+        if not query:
+            return []
+        start = bisect_left(self.names, query)
+        end = start
+        while end < len(self.names) and self.names[end].startswith(query):
+            end += 1
+        exact = [
+            self.ids[i] for i in range(start, end) if self.names[i] == query
+        ]
+        prefix = [
+            self.ids[i] for i in range(start, end) if self.names[i] != query
+        ]
+        result = (exact + prefix)[:limit]
+        if len(result) < limit:
+            result += [
+                pk
+                for name, pk in zip(self.names, self.ids)
+                if query in name and not name.startswith(query)
+            ][: limit - len(result)]
+        return result
+
+
+def get_ingredient_index():
+    """Index of ingredient names, rebuilt when the catalog changes"""
+    global _index
+    version = get_version("ingredients")
+    if _index is None or _index[0] != version:
+        items = Ingredient.objects.values_list("pk", "name")
+        _index = (version, PrefixIndex(items))
+    return _index[1]
@@ -0,0 +1,55 @@
+import hashlib
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from recipes.catalogs import get_version
+
+Catalog = namedtuple("Catalog", ("content", "etag", "last_modified"))
+
+
+def get_catalog(name, queryset, serializer_class):
+    """Pre-serialized JSON of the whole queryset, rebuilt on changes"""
+    version = get_version(name)
+    key = f"catalog:{name}:{version}"
+    catalog = cache.get(key)
+    if catalog is None:
+        data = serializer_class(queryset, many=True).data
+        content = JSONRenderer().render(data)
+        etag = f'"{hashlib.md5(content).hexdigest()}"'
+        catalog = Catalog(content, etag, version)
+        cache.set(key, catalog, settings.CATALOG_CACHE_TIMEOUT)
+    return catalog
+
+
+def catalog_response(request, catalog):
+    """JSON response honouring If-None-Match and If-Modified-Since"""
+    response = get_conditional_response(
+        request, etag=catalog.etag, last_modified=catalog.last_modified
+    )
+    if response is None:
+        response = HttpResponse(
+            catalog.content, content_type="application/json"
+        )
+    response["ETag"] = catalog.etag
+    response["Last-Modified"] = http_date(catalog.last_modified)
+    return response
+
+
+class CatalogMixin:
+    """Serves unfiltered list from the catalog cache"""
+
+    catalog_name = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        catalog = get_catalog(
+            self.catalog_name, self.get_queryset(), self.get_serializer_class()
+        )
+        return catalog_response(request, catalog)
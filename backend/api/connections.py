@@ -0,0 +1,124 @@
+import os
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+# Counters of the current worker process
+stats = Counter()
+
+
+def check_connection(connection):
+    """Close a persistent connection the server has dropped.
+
+    Django 3.2 has no CONN_HEALTH_CHECKS, it only notices a dead
+    connection when a query fails, so the first request after a database
+    or pooler restart gets an error. The check reads the same
+    CONN_HEALTH_CHECKS key as later versions do.
+    """
+    if connection.connection is None:
+        return
+    stats["reused"] += 1
+    if not connection.settings_dict.get("CONN_HEALTH_CHECKS"):
+        return
+    if connection.in_atomic_block or connection.is_usable():
+        return
+    stats["health_check_failures"] += 1
+    connection.close()
+
+
+def ensure_checked_connection(connection):
+    """ensure_connection() running the pending health check first"""
+    if not connection.health_check_done:
+        connection.health_check_done = True
+        check_connection(connection)
+    type(connection).ensure_connection(connection)
+
+
+def check_connections():
+    """Health check of the persistent connections, once per request.
+
+    As with CONN_HEALTH_CHECKS of Django 4.1, the check runs when a
+    connection is first used in the request, so requests answered from
+    the cache do not pay for a round trip to the database.
+    """
+    stats["requests"] += 1
+    for connection in connections.all():
+        if connection.settings_dict["CONN_MAX_AGE"] == 0:
+            continue
+        if "ensure_connection" not in vars(connection):
+            connection.ensure_connection = partial(
+                ensure_checked_connection, connection
+            )
+        connection.health_check_done = False
+
+
+def server_connections(connection):
+    """Connections to the database by state, from pg_stat_activity"""
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT coalesce(state, 'unknown'), count(*) "
+            "FROM pg_stat_activity WHERE datname = current_database() "
+            "GROUP BY 1"
+        )
+        return dict(cursor.fetchall())
+
+
+def pooler_pools(connection):
+    """SHOW POOLS of pgbouncer for the database, None without a pooler.
+
+    Needs the database user in the stats_users or admin_users of the
+    pooler.
+    """
+    if settings.DB_POOLER != "pgbouncer":
+        return None
+    params = connection.get_connection_params()
+    params["database"] = "pgbouncer"
+    pooler = connection.Database.connect(**params)
+    try:
+        pooler.autocommit = True
+        with pooler.cursor() as cursor:
+            cursor.execute("SHOW POOLS")
+            columns = [column[0] for column in cursor.description]
+            return [
+                dict(zip(columns, row))
+                for row in cursor.fetchall()
+                if row[0] == connection.settings_dict["NAME"]
+            ]
+    finally:
+        pooler.close()
+
+
+def get_pool_metrics():
+    """Connection reuse of this worker and pool state of the server"""
+    connection = connections["default"]
+    metrics = {
+        "pid": os.getpid(),
+        "vendor": connection.vendor,
+        "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+        "health_checks": bool(
+            connection.settings_dict.get("CONN_HEALTH_CHECKS")
+        ),
+        "pooler": settings.DB_POOLER or None,
+        "worker": {
+            name: stats[name]
+            for name in (
+                "requests",
+                "opened",
+                "reused",
+                "health_check_failures",
+            )
+        },
+    }
+    for name, collect in (
+        ("server", server_connections),
+        ("pools", pooler_pools),
+    ):
+        try:
+            metrics[name] = collect(connection)
+        except (DatabaseError, connection.Database.Error) as error:
+            metrics[name] = {"error": str(error)}
+    return metrics
@@ -1,7 +1,61 @@
-from rest_framework.serializers import DecimalField
+import base64
+import binascii
+import re
+from io import BytesIO
+
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from rest_framework.serializers import DecimalField, Field, ValidationError
 
 
 class CustomDecimalField(DecimalField):
     def to_representation(self, value):
         value = super().to_representation(value)
         return int(value) if value % 1 == 0 else value
+
+
+class Base64ImagePayloadField(Field):
+    """Accepts a base64 encoded image or an uploaded image file.
+
+    The payload is decoded and the image format identified from its
+    header, which rejects non-images with 400. Decoding the pixels,
+    resizing and recompressing are done by the image pool (see
+    recipes.images). Returns bytes or the uploaded file.
+    """
+
+    data_uri = re.compile(
+        r"^data:image/(?P<type>[a-z+.-]+);base64,(?P<payload>.*)$", re.S
+    )
+    allowed_types = ("jpeg", "jpg", "png", "gif", "webp", "bmp")
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            if not (data.content_type or "").startswith("image/"):
+                raise ValidationError("Неподдерживаемый формат изображения.")
+            self.identify(data)
+            data.seek(0)
+            return data
+        if not isinstance(data, str) or not data:
+            raise ValidationError("Загрузите изображение в формате base64.")
+        if data.startswith("data:"):
+            match = self.data_uri.match(data)
+            if match is None or match["type"] not in self.allowed_types:
+                raise ValidationError("Неподдерживаемый формат изображения.")
+            data = match["payload"]
+        try:
+            content = base64.b64decode(data, validate=True)
+        except binascii.Error:
+            raise ValidationError("Загрузите изображение в формате base64.")
+        self.identify(BytesIO(content))
+        return content
+
+    @staticmethod
+    def identify(file):
+        """Read the image header only, the pixels stay undecoded"""
+        try:
+            Image.open(file)
+        except (OSError, Image.DecompressionBombError):
+            raise ValidationError("Загрузите корректное изображение.")
+
+    def to_representation(self, value):
+        return value
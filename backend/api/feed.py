@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import Follow, Recipe
+
+
+def feed_key(user_id):
+    return f"feed:{user_id}"
+
+
+def get_feed_ids(user):
+    """Ids of the latest recipes of authors the user follows, newest first.
+
+    Built on read with one query over the (author, pub_date) index and
+    cached until the user's subscriptions or followed authors change.
+    """
+    key = feed_key(user.id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(
+            Recipe.objects.filter(author__in=user.follower.values("author"))
+            .order_by("-pub_date", "-id")
+            .values_list("id", flat=True)[: settings.RECIPE_FEED_SIZE]
+        )
+        cache.set(key, ids, settings.RECIPE_FEED_CACHE_TIMEOUT)
+    return ids
+
+
+def invalidate_feed(user_id):
+    cache.delete(feed_key(user_id))
+
+
+def invalidate_followers_feeds(author_id):
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        "user_id", flat=True
+    )
+    cache.delete_many([feed_key(user_id) for user_id in followers])
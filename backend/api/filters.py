@@ -1,42 +1,94 @@
 import django_filters as filters
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Case, Exists, OuterRef, When
+from django_filters.widgets import BooleanWidget
 
-from recipes.models import Ingredient, Recipe
+from api.autocomplete import get_ingredient_index
+from recipes.models import Favorite, Ingredient, Purchase, Recipe, Tag
+from recipes.search import search_recipes
 
 User = get_user_model()
 
 
 class IngredientNameFilter(filters.FilterSet):
-    name = filters.CharFilter(field_name="name", lookup_expr="istartswith")
+    name = filters.CharFilter(method="filter_name")
 
     class Meta:
         model = Ingredient
         fields = ("name", "measurement_unit")
 
+    def filter_name(self, queryset, name, value):
+        if not settings.INGREDIENT_AUTOCOMPLETE:
+            return queryset.filter(name__istartswith=value)
+        ids = get_ingredient_index().search(
+            value, settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+        )
+        if not ids:
+            return queryset.none()
+        rank = Case(
+            *(When(pk=pk, then=position) for position, pk in enumerate(ids))
+        )
+        return queryset.filter(pk__in=ids).order_by(rank)
+
 
 class RecipeFilter(filters.FilterSet):
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
-    tags = filters.AllValuesMultipleFilter(field_name="tags__slug")
+    # Slugs are looked up in the tags table only when passed, listing all
+    # slugs used by recipes scanned the recipes on every request
+    tags = filters.ModelMultipleChoiceFilter(
+        queryset=Tag.objects.all(),
+        to_field_name="slug",
+        method="filter_tags",
+    )
 
     is_favorited = filters.BooleanFilter(
         method="get_is_favorited",
+        widget=BooleanWidget(),
     )
     is_in_shopping_cart = filters.BooleanFilter(
         method="get_is_in_purchases",
+        widget=BooleanWidget(),
     )
+    search = filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Recipe
-        fields = ["is_favorited", "is_in_shopping_cart", "author", "tags"]
+        fields = [
+            "is_favorited",
+            "is_in_shopping_cart",
+            "author",
+            "tags",
+            "search",
+        ]
 
-    def get_is_favorited(self, queryset, name, value):
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        # Exists instead of a join: no duplicate rows, no distinct()
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef("pk"), tag__in=value
+                )
+            )
+        )
+
+    def filter_related_to_user(self, queryset, model, value):
+        if not value:
+            return queryset
         user = self.request.user
-        if value:
-            return Recipe.objects.filter(favorites__user=user)
-        return Recipe.objects.all()
+        if user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(
+            Exists(model.objects.filter(user=user, recipe=OuterRef("pk")))
+        )
+
+    def get_is_favorited(self, queryset, name, value):
+        return self.filter_related_to_user(queryset, Favorite, value)
 
     def get_is_in_purchases(self, queryset, name, value):
-        user = self.request.user
-        if value:
-            return Recipe.objects.filter(recipes_to_purchase__user=user)
-        return Recipe.objects.all()
+        return self.filter_related_to_user(queryset, Purchase, value)
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -0,0 +1,179 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("instrumentation", default=None)
+
+IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+NUMBER = re.compile(r"\b\d+\b")
+
+
+def fingerprint(sql):
+    """SQL with parameter lists and inlined numbers collapsed"""
+    return NUMBER.sub("?", IN_LIST.sub("IN (...)", sql))
+
+
+class RequestRecorder:
+    """Queries and timings of a single request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+        self.timings = defaultdict(float)
+        self.depth = Counter()
+        self.running = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @contextmanager
+    def record_queries(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield
+
+    def start(self, name):
+        self.running[name] = time.perf_counter()
+
+    def stop(self, name):
+        started = self.running.pop(name, None)
+        if started is not None:
+            self.timings[name] += time.perf_counter() - started
+
+    @contextmanager
+    def measure(self, name):
+        # Nested measurements of the same name are counted once
+        self.depth[name] += 1
+        if self.depth[name] == 1:
+            self.start(name)
+        try:
+            yield
+        finally:
+            self.depth[name] -= 1
+            if not self.depth[name]:
+                self.stop(name)
+
+    def duplicates(self):
+        return {
+            sql: count
+            for sql, count in self.fingerprints.most_common()
+            if count >= settings.QUERY_INSTRUMENTATION_DUPLICATES
+        }
+
+    def server_timing(self):
+        metrics = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"'
+        ]
+        metrics += [
+            f"{name};dur={duration * 1000:.1f}"
+            for name, duration in self.timings.items()
+        ]
+        total = time.perf_counter() - self.started
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+@contextmanager
+def measure(name):
+    """Add the block's duration to the current request's timings"""
+    recorder = _current.get()
+    if recorder is None:
+        yield
+        return
+    with recorder.measure(name):
+        yield
+
+
+class TimedSerializerMixin:
+    """Reports the time spent building serializer.data as "serialize" """
+
+    @property
+    def data(self):
+        with measure("serialize"):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class QueryInstrumentationMiddleware:
+    """Records queries and timings of a sample of requests.
+
+    Enabled by QUERY_INSTRUMENTATION for QUERY_INSTRUMENTATION_SAMPLE_RATE
+    of requests. Results go to the Server-Timing header and to a JSON
+    log line; repeated queries (N+1 patterns) are logged as warnings.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_INSTRUMENTATION or (
+            random.random() >= settings.QUERY_INSTRUMENTATION_SAMPLE_RATE
+        ):
+            return self.get_response(request)
+        recorder = RequestRecorder()
+        token = _current.set(recorder)
+        try:
+            with recorder.record_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, recorder)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        recorder = _current.get()
+        if recorder is not None:
+            recorder.start("view")
+
+    def process_template_response(self, request, response):
+        recorder = _current.get()
+        if recorder is not None:
+            recorder.stop("view")
+            recorder.start("render")
+            response.add_post_render_callback(
+                lambda response: recorder.stop("render")
+            )
+        return response
+
+    def report(self, request, response, recorder):
+        recorder.stop("view")
+        response["Server-Timing"] = recorder.server_timing()
+        response.instrumentation = recorder
+        duplicates = recorder.duplicates()
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": recorder.queries,
+            "db_ms": round(recorder.db_time * 1000, 1),
+            **{
+                f"{name}_ms": round(duration * 1000, 1)
+                for name, duration in recorder.timings.items()
+            },
+            "duplicates": duplicates,
+        }
+        level = logging.WARNING if duplicates else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,137 @@
+import json
+import platform
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.instrumentation import RequestRecorder
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, round(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = "measures latency and query counts of the API hot paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=50,
+            help="timed requests per endpoint",
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="results file, benchmark-<time>.json by default",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1:
+            raise CommandError("--requests must be positive")
+        user = (
+            User.objects.filter(
+                purchases__isnull=False, follower__isnull=False
+            )
+            .order_by("id")
+            .first()
+        )
+        if user is None:
+            raise CommandError("No user with purchases, run seed_data first")
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(user)
+
+        results = {
+            name: self.measure(paths, options["requests"])
+            for name, paths in self.get_endpoints(user).items()
+        }
+        report = {
+            "started_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "requests": options["requests"],
+            "rows": {
+                "users": User.objects.count(),
+                "recipes": Recipe.objects.count(),
+                "ingredients": Ingredient.objects.count(),
+            },
+            "endpoints": results,
+        }
+        output = options["output"] or (
+            f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name}: p50 {result['p50_ms']} ms, "
+                f"p99 {result['p99_ms']} ms, {result['queries']} queries"
+            )
+        self.stdout.write(f"results written to {output}")
+
+    def get_endpoints(self, user):
+        recipes = reverse("api:recipes-list")
+        tag = Tag.objects.values_list("slug", flat=True).first()
+        # The same ingredients on every run, spread over the catalog, so
+        # results of runs on the same data are comparable
+        names = list(
+            Ingredient.objects.order_by("id").values_list("name", flat=True)
+        )
+        names = names[:: max(len(names) // 20, 1)][:20]
+        middle_page = Recipe.objects.count() // settings.ITEMS_PER_PAGE // 2
+        return {
+            "recipes": [recipes],
+            "recipes_deep_page": [f"{recipes}?page={middle_page + 1}"],
+            "recipes_filtered": [
+                f"{recipes}?tags={tag}&is_favorited=1",
+                f"{recipes}?author={user.id}",
+            ],
+            "subscriptions": [
+                reverse("api:users-subscriptions") + "?recipes_limit=3"
+            ],
+            "ingredients_search": [
+                f"{reverse('api:ingredients-list')}?name={name[:3]}"
+                for name in names
+            ],
+            "download_shopping_cart": [
+                reverse("api:recipes-download-shopping-cart")
+            ],
+        }
+
+    def measure(self, paths, requests):
+        """Time requests cycling through paths, after one warm-up each"""
+        for path in paths:
+            self.client.get(path)
+        durations = []
+        queries = []
+        errors = 0
+        for number in range(requests):
+            recorder = RequestRecorder()
+            started = time.perf_counter()
+            with recorder.record_queries():
+                response = self.client.get(paths[number % len(paths)])
+            durations.append((time.perf_counter() - started) * 1000)
+            queries.append(recorder.queries)
+            errors += response.status_code >= 400
+        return {
+            "p50_ms": round(percentile(durations, 50), 2),
+            "p90_ms": round(percentile(durations, 90), 2),
+            "p99_ms": round(percentile(durations, 99), 2),
+            "mean_ms": round(statistics.mean(durations), 2),
+            "queries": max(queries),
+            "errors": errors,
+        }
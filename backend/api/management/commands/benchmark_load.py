@@ -0,0 +1,155 @@
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.management.commands.benchmark_api import percentile
+
+PATHS = (
+    "/api/tags/",
+    "/api/ingredients/?name=%D0%BC%D0%BE",
+    "/api/recipes/",
+    "/api/recipes/?page=2",
+)
+SLOW_PAUSE = 0.05
+
+
+class Command(BaseCommand):
+    help = (
+        "loads a running server with concurrent clients, part of them "
+        "reading responses slowly"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://localhost:8000",
+            help="server to load, started in the mode being measured",
+        )
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument(
+            "--slow-clients",
+            type=int,
+            default=10,
+            help="clients sending and reading in small chunks with pauses",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=30, help="seconds"
+        )
+        parser.add_argument(
+            "--label",
+            default="",
+            help="name of the run in the results, e.g. the server mode",
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="results file, load-<time>.json by default",
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be positive")
+        url = urlsplit(options["url"])
+        if url.scheme != "http" or not url.hostname:
+            raise CommandError("--url must be an http:// address")
+        self.host, self.port = url.hostname, url.port or 80
+        self.deadline = time.monotonic() + options["duration"]
+        self.lock = threading.Lock()
+        self.durations = []
+        self.errors = 0
+
+        slow = min(options["slow_clients"], options["concurrency"])
+        clients = [
+            threading.Thread(target=self.client, args=(number < slow,))
+            for number in range(options["concurrency"])
+        ]
+        started = time.monotonic()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.monotonic() - started
+
+        if not self.durations:
+            raise CommandError(f"No successful requests to {options['url']}")
+        report = {
+            "label": options["label"],
+            "url": options["url"],
+            "concurrency": options["concurrency"],
+            "slow_clients": slow,
+            "duration_s": round(elapsed, 1),
+            "requests": len(self.durations),
+            "errors": self.errors,
+            "rps": round(len(self.durations) / elapsed, 1),
+            "p50_ms": round(percentile(self.durations, 50), 2),
+            "p90_ms": round(percentile(self.durations, 90), 2),
+            "p99_ms": round(percentile(self.durations, 99), 2),
+            "mean_ms": round(statistics.mean(self.durations), 2),
+        }
+        output = options["output"] or (
+            f"load-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(
+            f"{report['requests']} requests, {report['rps']} rps, "
+            f"p50 {report['p50_ms']} ms, p99 {report['p99_ms']} ms, "
+            f"{report['errors']} errors"
+        )
+        self.stdout.write(f"results written to {output}")
+
+    def client(self, slow):
+        """Request PATHS in turn until the deadline.
+
+        Slow clients are left out of the latency figures: they stand for
+        mobile users holding a connection open, and the measurement is how
+        much they slow down everyone else.
+        """
+        number = 0
+        while time.monotonic() < self.deadline:
+            path = PATHS[number % len(PATHS)]
+            number += 1
+            started = time.perf_counter()
+            try:
+                status = self.request(path, slow)
+            except OSError:
+                status = None
+            duration = (time.perf_counter() - started) * 1000
+            with self.lock:
+                if status is None or status >= 400:
+                    self.errors += 1
+                elif not slow:
+                    self.durations.append(duration)
+
+    def request(self, path, slow):
+        connection = http.client.HTTPConnection(
+            self.host, self.port, timeout=30
+        )
+        try:
+            if not slow:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                return response.status
+            # Send the request and read the response a few bytes at a
+            # time, the way a client on a poor mobile network does
+            connection.connect()
+            head = (
+                f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode()
+            for start in range(0, len(head), 16):
+                connection.sock.sendall(head[start:start + 16])
+                time.sleep(SLOW_PAUSE)
+            response = http.client.HTTPResponse(connection.sock, method="GET")
+            response.begin()
+            while response.read(1024):
+                time.sleep(SLOW_PAUSE)
+            return response.status
+        finally:
+            connection.close()
@@ -1,5 +1,242 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    Cursor,
+    CursorPagination,
+    PageNumberPagination,
+)
+
+
+def estimate_count(queryset):
+    """Planner's row estimate for the model's table, PostgreSQL only"""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row else None
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator that avoids running COUNT(*) on every page.
+
+    Unfiltered large tables use the planner's estimate, other counts are
+    cached for a short time under a hash of the SQL, which includes the
+    filters and the user's id. With exact=True the count is always
+    computed, and the cache refreshed.
+    """
+
+    def __init__(self, object_list, per_page, exact=False, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.exact = exact
+        self.approximate = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not self.exact and not queryset.query.where:
+            estimate = estimate_count(queryset)
+            if (
+                estimate is not None
+                and estimate >= settings.PAGINATION_ESTIMATE_THRESHOLD
+            ):
+                self.approximate = True
+                return estimate
+        try:
+            sql = str(queryset.query)
+        except EmptyResultSet:
+            return 0
+        key = f"pagination:count:{hashlib.sha1(sql.encode()).hexdigest()}"
+        if not self.exact:
+            count = cache.get(key)
+            if count is not None:
+                self.approximate = True
+                return count
+        count = queryset.count()
+        cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # The real last page may lie past the approximate one
+            if not self.approximate or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        # Slice by page size only, so a stale count can't cut the page
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+
+class KeysetPagination(CursorPagination):
+    """Keyset pagination without COUNT(*) and OFFSET.
+
+    The cursor holds the values of every ordering field of the last row
+    shown, and the next page starts strictly after that row, so rows with
+    equal pub_date are neither repeated nor skipped. Views can override
+    the ordering with cursor_ordering; it must end with a unique field.
+    """
+
+    page_size_query_param = "limit"
+    ordering = ("-pub_date", "-id")
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, "cursor_ordering", self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = [
+            self.flip(field) if reverse else field for field in self.ordering
+        ]
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(
+                self.after(ordering, self.cursor.position)
+            )
+        # One more row tells whether there is a page beyond this one
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def after(ordering, position):
+        """Rows past the position: (a, b) < (x, y) as a < x or a = x, b < y"""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def get_fields(self):
+        return [
+            self.model._meta.get_field(field.lstrip("-"))
+            for field in self.ordering
+        ]
+
+    def get_link(self, instance, reverse):
+        position = json.dumps(
+            [field.value_to_string(instance) for field in self.get_fields()]
+        )
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=reverse, position=position)
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_link(self.page[0], reverse=True)
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            # An empty cursor asks for the first page
+            return None
+        fields = self.get_fields()
+        try:
+            values = json.loads(cursor.position)
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            position = [
+                field.to_python(value) for field, value in zip(fields, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=cursor.reverse, position=position)
 
 
 class CustomPageNumberPagination(PageNumberPagination):
+    """Page number pagination, or keyset one when cursor param is passed.
+
+    An empty cursor (?cursor=) requests the first keyset page. Querysets
+    ordered otherwise than the keyset, like ranked search results or
+    popular recipes, ignore the cursor and keep their order. Counts are
+    cached or estimated (see CachedCountPaginator), ?exact_count=1 asks
+    for the exact value.
+    """
+
     page_size_query_param = "limit"
+    exact_count_query_param = "exact_count"
+    cursor_pagination_class = KeysetPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def django_paginator_class(self, queryset, page_size):
+        exact = self.request.query_params.get(self.exact_count_query_param)
+        return CachedCountPaginator(
+            queryset, page_size, exact=exact in ("1", "true")
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_param in request.query_params and self.keyset_ordered(
+            queryset, request, view
+        ):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.request = request
+        return super().paginate_queryset(queryset, request, view)
+
+    def keyset_ordered(self, queryset, request, view):
+        """Whether the queryset is ordered the way the keyset pages it"""
+        order_by = tuple(queryset.query.order_by)
+        if not order_by:
+            return True
+        ordering = self.cursor_pagination_class().get_ordering(
+            request, queryset, view
+        )
+        return order_by == tuple(ordering)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
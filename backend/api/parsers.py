@@ -0,0 +1,43 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """Multipart form where nested values are sent as JSON strings.
+
+    Values of view.multipart_json_fields starting with "[" or "{" are
+    decoded as JSON, malformed ones are rejected with 400. Fields listed
+    in view.multipart_list_fields are always lists, either of repeated
+    values or of a JSON list. Other values are kept as sent. Files are
+    streamed to temporary files by Django upload handlers.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        view = (parser_context or {}).get("view")
+        json_fields = getattr(view, "multipart_json_fields", ())
+        list_fields = getattr(view, "multipart_list_fields", ())
+        data = {}
+        for key, values in result.data.lists():
+            if key in json_fields:
+                values = [self.decode(key, value) for value in values]
+            if key in list_fields:
+                data[key] = [
+                    item
+                    for value in values
+                    for item in (value if isinstance(value, list) else [value])
+                ]
+            else:
+                data[key] = values[-1]
+        return DataAndFiles(data, result.files.dict())
+
+    @staticmethod
+    def decode(key, value):
+        if value[:1] not in ("[", "{"):
+            return value
+        try:
+            return json.loads(value)
+        except ValueError as error:
+            raise ParseError(f"Некорректный JSON в поле {key}: {error}")
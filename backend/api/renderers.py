@@ -0,0 +1,119 @@
+import csv
+import io
+import os
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Base class for shopping list file formats.
+
+    Items are dicts with name, measurement_unit and amount keys.
+    Error payloads (dicts) are rendered as JSON.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, list):
+            response = (renderer_context or {}).get("response")
+            if response is not None:
+                response["Content-Type"] = "application/json"
+            return renderers.JSONRenderer().render(data)
+        return self.render_items(data)
+
+    def render_items(self, items):
+        raise NotImplementedError
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+    def render_items(self, items):
+        return "".join(
+            f'{item["name"]} - {item["amount"]} '
+            f'{item["measurement_unit"]} \n'
+            for item in items
+        ).encode(self.charset)
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def render_items(self, items):
+        stream = io.StringIO()
+        writer = csv.DictWriter(
+            stream, fieldnames=("name", "measurement_unit", "amount")
+        )
+        writer.writeheader()
+        writer.writerows(items)
+        return stream.getvalue().encode(self.charset)
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = "application/json"
+    format = "json"
+    charset = None
+
+    def render_items(self, items):
+        return renderers.JSONRenderer().render(items)
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+    font_size = 12
+    line_height = 7 * mm
+    margin = 20 * mm
+
+    def get_font(self):
+        """Standard PDF fonts have no cyrillic, register a TTF if we can"""
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if not os.path.exists(font_path):
+            return "Helvetica"
+        name = os.path.splitext(os.path.basename(font_path))[0]
+        if name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(name, font_path))
+        return name
+
+    def render_items(self, items):
+        stream = io.BytesIO()
+        pdf = canvas.Canvas(stream, pagesize=A4)
+        font = self.get_font()
+        width, height = A4
+        y = height - self.margin
+        pdf.setFont(font, self.font_size + 4)
+        pdf.drawString(self.margin, y, "Список покупок")
+        y -= 2 * self.line_height
+        pdf.setFont(font, self.font_size)
+        for item in items:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - self.margin
+            pdf.drawString(
+                self.margin,
+                y,
+                f'{item["name"]} - {item["amount"]} '
+                f'{item["measurement_unit"]}',
+            )
+            y -= self.line_height
+        pdf.save()
+        return stream.getvalue()
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+    ShoppingListPDFRenderer,
+)
@@ -3,6 +3,7 @@ from rest_framework import serializers
 
 from .recipe_serializer import BriefRecipeSerializer
 from .user_serializer import CustomUserSerializer
+from api.instrumentation import TimedListSerializer
 from recipes.models import Follow, Recipe
 
 User = get_user_model()
@@ -40,17 +41,11 @@ class FollowSerializer(serializers.ModelSerializer):
 class FollowerSerializer(CustomUserSerializer):
     """Serializer for User model to serialize following information"""
 
-    email = serializers.ReadOnlyField(source="author.email")
-    id = serializers.ReadOnlyField(source="author.id")
-    username = serializers.ReadOnlyField(source="author.username")
-    first_name = serializers.ReadOnlyField(source="author.first_name")
-    last_name = serializers.ReadOnlyField(source="author.last_name")
-    is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
+        list_serializer_class = TimedListSerializer
         fields = (
             "email",
             "id",
@@ -62,20 +57,12 @@ class FollowerSerializer(CustomUserSerializer):
             "recipes_count",
         )
 
-    def get_is_subscribed(self, obj):
-        request = self.context.get("request")
-        if request.user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=obj.user, author=obj.author).exists()
-
     def get_recipes(self, obj):
+        if hasattr(obj, "preview_recipes"):
+            return BriefRecipeSerializer(obj.preview_recipes, many=True).data
         request = self.context.get("request")
         limit = request.GET.get("recipes_limit")
-        queryset = Recipe.objects.filter(author=obj.author)
+        queryset = Recipe.objects.filter(author=obj)
         if limit is not None:
-            queryset = Recipe.objects.filter(author=obj.author)[: int(limit)]
-
+            queryset = queryset[: int(limit)]
         return BriefRecipeSerializer(queryset, many=True).data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
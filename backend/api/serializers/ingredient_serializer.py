@@ -10,9 +10,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source="ingredient", queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(source="ingredient_id")
     amount = serializers.IntegerField()
 
     class Meta:
@@ -1,16 +1,16 @@
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
-from django.db.models import F
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 from .ingredient_serializer import AddIngredientSerializer
 from .tag_serializer import TagSerializer
 from .user_serializer import CustomUserSerializer
-from api.custom_fields import CustomDecimalField
+from api.custom_fields import Base64ImagePayloadField, CustomDecimalField
+from api.instrumentation import TimedListSerializer, TimedSerializerMixin
+from recipes.images import schedule_recipe_image
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -19,6 +19,7 @@ from recipes.models import (
     Recipe,
     Tag,
 )
+from recipes.search import update_search_index
 
 User = get_user_model()
 
@@ -26,7 +27,14 @@ User = get_user_model()
 class BriefRecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = (
+            "id",
+            "name",
+            "image",
+            "list_thumbnail",
+            "detail_thumbnail",
+            "cooking_time",
+        )
 
 
 class IngredientForRecipeSerializer(serializers.ModelSerializer):
@@ -41,7 +49,7 @@ class IngredientForRecipeSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "measurement_unit", "amount")
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     author = CustomUserSerializer(
         read_only=True, default=serializers.CurrentUserDefault()
@@ -56,6 +64,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
+        list_serializer_class = TimedListSerializer
         fields = (
             "id",
             "tags",
@@ -65,11 +74,16 @@ class RecipeSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_status",
+            "list_thumbnail",
+            "detail_thumbnail",
             "text",
             "cooking_time",
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
         request = self.context.get("request")
         if request.user.is_anonymous:
             return False
@@ -79,6 +93,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         ).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
         request = self.context.get("request")
         if request.user.is_anonymous:
             return False
@@ -91,9 +107,7 @@ class AddRecipeSerializer(serializers.ModelSerializer):
     )
     ingredients = AddIngredientSerializer(many=True)
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField(max_length=None, use_url=True)
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    image = Base64ImagePayloadField()
 
     class Meta:
         model = Recipe
@@ -102,71 +116,98 @@ class AddRecipeSerializer(serializers.ModelSerializer):
             "tags",
             "author",
             "ingredients",
-            "is_favorited",
-            "is_in_shopping_cart",
             "name",
             "image",
             "text",
             "cooking_time",
         )
 
-    def get_is_favorited(self, obj):
-        request = self.context.get("request")
-        if request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(
-            recipe=obj,
-            user=request.user,
-        ).exists()
-
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get("request")
-        if request.user.is_anonymous:
-            return False
-        return Purchase.objects.filter(user=request.user, recipe=obj).exists()
-
     def create_ingredients(self, recipe, ingredients):
-        for ingredient in ingredients:
-            ingr_instance = get_object_or_404(
-                Ingredient, id=ingredient["ingredient"].id
-            )
-            amount = ingredient["amount"]
-            if IngredientForRecipe.objects.filter(
-                recipe=recipe, ingredient=ingr_instance
-            ).exists():
-                amount += F("amount")
-            IngredientForRecipe.objects.update_or_create(
-                {"amount": amount},
-                recipe=recipe,
-                ingredient=ingr_instance,
+        IngredientForRecipe.objects.bulk_create(
+            IngredientForRecipe(recipe=recipe, **ingredient)
+            for ingredient in ingredients
+        )
+
+    def update_ingredients(self, recipe, ingredients):
+        # Ingredients are unique, validate() rejects repeated ids
+        amounts = {
+            ingredient["ingredient_id"]: ingredient["amount"]
+            for ingredient in ingredients
+        }
+        current = {
+            row.ingredient_id: row
+            for row in IngredientForRecipe.objects.filter(recipe=recipe)
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            IngredientForRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientForRecipe.objects.bulk_update(changed, ("amount",))
+        IngredientForRecipe.objects.bulk_create(
+            IngredientForRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
             )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop("tags")
         ingredients = validated_data.pop("ingredients")
+        image = validated_data.pop("image")
         author = self.context.get("request").user
-        recipe = Recipe.objects.create(author=author, **validated_data)
+        recipe = Recipe(author=author, **validated_data)
+        schedule_recipe_image(recipe, image)
+        recipe.save()
         recipe.tags.set(tags)
         self.create_ingredients(recipe, ingredients)
+        update_search_index(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if "tags" in self.initial_data:
             tags = validated_data.pop("tags")
             instance.tags.set(tags)
         if "ingredients" in self.initial_data:
             ingredients = validated_data.pop("ingredients")
-            instance.ingredients.clear()
-            self.create_ingredients(instance, ingredients)
-        instance.name = validated_data.get("name", instance.name)
-        instance.text = validated_data.get("text", instance.text)
-        instance.cooking_time = validated_data.get(
-            "cooking_time", instance.cooking_time
-        )
-        instance.image = validated_data.get("image", instance.image)
-        instance.save()
+            self.update_ingredients(instance, ingredients)
+        # Only the edited columns are written: the image job and the
+        # counters update the same row concurrently
+        fields = [
+            field
+            for field in ("name", "text", "cooking_time")
+            if field in validated_data
+        ]
+        for field in fields:
+            setattr(instance, field, validated_data[field])
+        if "image" in validated_data:
+            schedule_recipe_image(instance, validated_data["image"])
+            fields += ["image_status", "image_upload"]
+        if fields:
+            instance.save(update_fields=fields)
+        update_search_index(instance)
         return instance
 
+    def validate_ingredients(self, ingredients):
+        ids = {ingredient["ingredient_id"] for ingredient in ingredients}
+        missing = ids - Ingredient.objects.in_bulk(ids).keys()
+        if missing:
+            raise serializers.ValidationError(
+                "Ингредиенты не найдены: "
+                + ", ".join(map(str, sorted(missing)))
+            )
+        return ingredients
+
     def validate(self, data):
         ingredients = self.initial_data.get("ingredients")
         cooking_time = self.initial_data.get("cooking_time")
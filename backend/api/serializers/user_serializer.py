@@ -2,6 +2,7 @@ from django.contrib.auth import get_user_model
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers, validators
 
+from api.instrumentation import TimedListSerializer, TimedSerializerMixin
 from recipes.models import Follow
 
 User = get_user_model()
@@ -15,7 +16,7 @@ class UserRegistrationSerializer(UserCreateSerializer):
         fields = ("email", "username", "first_name", "last_name", "password")
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(TimedSerializerMixin, UserSerializer):
     """To provide User info"""
 
     email = serializers.EmailField(
@@ -28,6 +29,7 @@ class CustomUserSerializer(UserSerializer):
 
     class Meta:
         model = User
+        list_serializer_class = TimedListSerializer
         fields = (
             "email",
             "id",
@@ -37,10 +39,21 @@ class CustomUserSerializer(UserSerializer):
             "is_subscribed",
         )
 
+    def get_subscriptions(self):
+        """Ids of authors followed by request user, loaded once per request"""
+        if "subscriptions" not in self.context:
+            user = self.context["request"].user
+            self.context["subscriptions"] = set(
+                Follow.objects.filter(user=user).values_list(
+                    "author_id", flat=True
+                )
+            )
+        return self.context["subscriptions"]
+
     def get_is_subscribed(self, instance):
+        if hasattr(instance, "is_subscribed"):
+            return instance.is_subscribed
         request = self.context["request"]
         if request.user.is_anonymous or request.user == instance:
             return False
-        return Follow.objects.filter(
-            user=request.user, author=instance
-        ).exists()
+        return instance.id in self.get_subscriptions()
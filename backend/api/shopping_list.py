@@ -0,0 +1,64 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+
+from recipes.models import IngredientForRecipe
+
+VERSION_KEY = "shopping_list:version"
+
+
+def get_shopping_list(user):
+    """Ingredients of all recipes in user's cart, summed per unit"""
+    ingredients = (
+        IngredientForRecipe.objects.filter(
+            recipe__recipes_to_purchase__user=user
+        )
+        .values(
+            name=F("ingredient__name"),
+            measurement_unit=F("ingredient__measurement_unit"),
+        )
+        .annotate(total=Sum("amount"))
+        .order_by("name", "measurement_unit")
+    )
+    return [
+        {
+            "name": item["name"],
+            "measurement_unit": item["measurement_unit"],
+            "amount": item["total"],
+        }
+        for item in ingredients.iterator()
+    ]
+
+
+def get_cart_digest(user):
+    """Hash of user's cart content.
+
+    Cart changes give a new digest, recipe edits bump the shared version
+    (see api.signals), so stale renders are never served.
+    """
+    recipes = user.purchases.order_by("recipe_id").values_list(
+        "recipe_id", flat=True
+    )
+    version = cache.get(VERSION_KEY, "")
+    content = f"{version}:{','.join(map(str, recipes))}"
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def invalidate_shopping_lists():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def render_shopping_list(user, renderer):
+    """Shopping list rendered by renderer, cached per cart content"""
+    key = (
+        f"shopping_list:{user.id}:{renderer.format}:"
+        f"{get_cart_digest(user)}"
+    )
+    content = cache.get(key)
+    if content is None:
+        content = renderer.render(get_shopping_list(user))
+        cache.set(key, content, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+    return content
@@ -0,0 +1,84 @@
+from functools import partial
+
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.connections import check_connections, stats
+from api.feed import invalidate_feed, invalidate_followers_feeds
+from api.shopping_list import invalidate_shopping_lists
+from recipes.catalogs import invalidate_catalog
+from recipes.counters import change_counter
+from recipes.models import (
+    Favorite,
+    Follow,
+    Ingredient,
+    Purchase,
+    Recipe,
+    Tag,
+)
+from recipes.search import remove_from_search_index
+
+
+# Caches are invalidated once the change is committed: a request served
+# between the signal and the commit would cache the old rows under the
+# new version
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            partial(invalidate_followers_feeds, instance.author_id)
+        )
+    else:
+        transaction.on_commit(invalidate_shopping_lists)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    remove_from_search_index(instance)
+    transaction.on_commit(
+        partial(invalidate_followers_feeds, instance.author_id)
+    )
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_feed, instance.user_id))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    transaction.on_commit(partial(invalidate_catalog, "tags"))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    transaction.on_commit(partial(invalidate_catalog, "ingredients"))
+    transaction.on_commit(invalidate_shopping_lists)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Purchase)
+@receiver(post_save, sender=Recipe)
+def counted_row_saved(sender, instance, created, **kwargs):
+    if created:
+        change_counter(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_delete, sender=Recipe)
+def counted_row_deleted(sender, instance, **kwargs):
+    change_counter(instance, -1)
+
+
+@receiver(request_started)
+def request_started_checks(**kwargs):
+    check_connections()
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    stats["opened"] += 1
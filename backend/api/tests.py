@@ -1,12 +1,118 @@
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 from rest_framework import status
-from rest_framework.test import APITestCase, force_authenticate
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import (
+    APIRequestFactory,
+    APITestCase,
+    force_authenticate,
+)
+
+from api import autocomplete
+from api.autocomplete import PrefixIndex
+from api.connections import check_connection, check_connections, stats
+from api.instrumentation import RequestRecorder, fingerprint
+from api.management.commands.benchmark_api import Command as BenchmarkCommand
+from api.serializers import (
+    AddRecipeSerializer,
+    FollowerSerializer,
+    IngredientSerializer,
+    RecipeSerializer,
+    TagSerializer,
+)
+from recipes import images
+from recipes.catalogs import get_version
+from recipes.models import (
+    Favorite,
+    Follow,
+    Ingredient,
+    IngredientForRecipe,
+    Purchase,
+    Recipe,
+    Tag,
+)
+from recipes.search import update_search_index
 
 User = get_user_model()
 
+# 1x1 transparent PNG
+IMAGE_PAYLOAD = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA"
+    "DUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+def create_tags(count):
+    return [
+        Tag.objects.create(name=f"tag{i}", slug=f"tag{i}", color=f"#00000{i}")
+        for i in range(count)
+    ]
+
+
+def create_ingredients(count):
+    return [
+        Ingredient.objects.create(name=f"ingr{i}", measurement_unit="г")
+        for i in range(count)
+    ]
+
+
+def create_recipe(author, name="recipe", tags=(), ingredients=(), **fields):
+    """Recipe with a stored image path, tags and 100 of each ingredient"""
+    recipe = Recipe.objects.create(
+        name=name,
+        author=author,
+        **{
+            "image": "recipe_images/test.jpg",
+            "text": "text",
+            "cooking_time": 10,
+            **fields,
+        },
+    )
+    if tags:
+        recipe.tags.set(tags)
+    IngredientForRecipe.objects.bulk_create(
+        IngredientForRecipe(recipe=recipe, ingredient=ingredient, amount=100)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+class TemporaryMediaMixin:
+    """Files written by the tests go to a temporary MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = media.name
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
 
 class UserTests(APITestCase):
+    def setUp(self):
+        # Page counts are cached across tests under the same SQL
+        cache.clear()
+
     def test_create_account(self):
         """
         Ensure we can create a new account object.
@@ -49,3 +155,1452 @@ class UserTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         data = response.data
         self.assertEqual(data["count"], 2)
+
+
+class RecipeQueryCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        tags = create_tags(3)
+        ingredients = create_ingredients(3)
+        for i in range(10):
+            author = User.objects.create(
+                username=f"author{i}", email=f"author{i}@ya.ru"
+            )
+            create_recipe(author, f"recipe{i}", tags, ingredients)
+
+    def test_recipe_list_query_count(self):
+        """
+        Ensure recipe list query count doesn't depend on page size.
+        """
+        url = reverse("api:recipes-list")
+        for limit in (1, 10):
+            cache.clear()
+            with self.assertNumQueries(4):
+                response = self.client.get(url, {"limit": limit})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data["results"]), limit)
+
+    def test_recipe_list_count_is_cached(self):
+        url = reverse("api:recipes-list")
+        cache.clear()
+        with self.assertNumQueries(4):
+            self.client.get(url, {"page": 2, "limit": 3})
+        Recipe.objects.filter(name="recipe0").delete()
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {"page": 2, "limit": 3})
+        self.assertEqual(response.data["count"], 10)
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {"exact_count": 1})
+        self.assertEqual(response.data["count"], 9)
+
+    def test_recipe_cursor_pagination(self):
+        url = reverse("api:recipes-list") + "?cursor=&limit=3"
+        names = []
+        while url:
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertNotIn("count", response.data)
+            names += [recipe["name"] for recipe in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(
+            names,
+            list(
+                Recipe.objects.order_by("-pub_date", "-id").values_list(
+                    "name", flat=True
+                )
+            ),
+        )
+
+    def test_recipe_cursor_ties(self):
+        """Recipes published at the same moment are paged by id"""
+        Recipe.objects.update(pub_date=timezone.now())
+        url = reverse("api:recipes-list") + "?cursor=&limit=3"
+        pages = []
+        while url:
+            response = self.client.get(url)
+            pages.append([r["name"] for r in response.data["results"]])
+            url = response.data["next"]
+        self.assertEqual(
+            sum(pages, []),
+            list(
+                Recipe.objects.order_by("-id").values_list("name", flat=True)
+            ),
+        )
+
+        url = response.data["previous"]
+        for page in reversed(pages[:-1]):
+            response = self.client.get(url)
+            self.assertEqual(
+                [r["name"] for r in response.data["results"]], page
+            )
+            url = response.data["previous"]
+        self.assertIsNone(url)
+
+    def test_recipe_invalid_cursor(self):
+        url = reverse("api:recipes-list")
+        response = self.client.get(url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ResponseShapeTestCase(APITestCase):
+    """Three authors with two recipes each, two of them followed by user.
+
+    The first recipe of every author is in the user's favorites and cart.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user", email="user@ya.ru")
+        tags = create_tags(2)
+        cls.ingredients = create_ingredients(3)
+        cls.authors = [
+            User.objects.create(username=f"author{i}", email=f"a{i}@ya.ru")
+            for i in range(3)
+        ]
+        for number, author in enumerate(cls.authors):
+            for i in range(2):
+                recipe = create_recipe(
+                    author,
+                    f"{author.username} recipe{i}",
+                    tags[: i + 1],
+                    cls.ingredients[number:],
+                )
+                if i == 0:
+                    Favorite.objects.create(user=cls.user, recipe=recipe)
+                    Purchase.objects.create(user=cls.user, recipe=recipe)
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def reference_request(self, path="/", params=None):
+        request = APIRequestFactory().get(path, params)
+        request.user = self.user
+        return request
+
+    @staticmethod
+    def as_json(data):
+        return json.loads(JSONRenderer().render(data))
+
+
+class ResponseShapeTests(ResponseShapeTestCase):
+    """Optimized endpoints answer exactly what the plain serializers do.
+
+    References are built by the serializers' fallback paths, which query
+    per row the way the endpoints did before the query plans.
+    """
+
+    def test_recipe_list_and_detail(self):
+        response = self.client.get(reverse("api:recipes-list"), {"limit": 6})
+        reference = RecipeSerializer(
+            Recipe.objects.all(),
+            many=True,
+            context={"request": self.reference_request()},
+        ).data
+        self.assertEqual(response.json()["results"], self.as_json(reference))
+
+        recipe = Recipe.objects.first()
+        response = self.client.get(
+            reverse("api:recipes-detail", args=(recipe.id,))
+        )
+        self.assertEqual(response.json(), self.as_json(reference[0]))
+
+
+class AuthorSerializationTests(ResponseShapeTestCase):
+    def test_users_is_subscribed(self):
+        response = self.client.get(reverse("api:users-list"), {"limit": 10})
+        followed = set(
+            Follow.objects.filter(user=self.user).values_list(
+                "author_id", flat=True
+            )
+        )
+        users = response.json()["results"]
+        self.assertEqual(
+            {user["id"]: user["is_subscribed"] for user in users},
+            {user.id: user.id in followed for user in User.objects.all()},
+        )
+
+    def test_anonymous_is_subscribed_to_nobody(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse("api:users-list"), {"limit": 10})
+        self.assertEqual(
+            {user["is_subscribed"] for user in response.json()["results"]},
+            {False},
+        )
+
+
+class SubscriptionsTests(ResponseShapeTestCase):
+    def test_subscriptions(self):
+        for params in ({}, {"recipes_limit": 1}):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    reverse("api:users-subscriptions"), params
+                )
+                reference = FollowerSerializer(
+                    User.objects.filter(following__user=self.user).order_by(
+                        "id"
+                    ),
+                    many=True,
+                    context={"request": self.reference_request("/", params)},
+                ).data
+                self.assertEqual(
+                    response.json()["results"], self.as_json(reference)
+                )
+
+    def test_subscriptions_recipes_limit_is_validated(self):
+        url = reverse("api:users-subscriptions")
+        for value in ("abc", "-1", "1.5"):
+            with self.subTest(value):
+                response = self.client.get(url, {"recipes_limit": value})
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST
+                )
+                self.assertIn("recipes_limit", response.json())
+        response = self.client.get(url, {"recipes_limit": 0})
+        self.assertEqual(
+            [author["recipes"] for author in response.json()["results"]],
+            [[], []],
+        )
+
+
+class RecipeWriteTests(TemporaryMediaMixin, ResponseShapeTestCase):
+    def test_recipe_create_matches_detail(self):
+        response = self.client.post(
+            reverse("api:recipes-list"),
+            {
+                "name": "new",
+                "text": "text",
+                "cooking_time": 5,
+                "image": IMAGE_PAYLOAD,
+                "tags": [Tag.objects.first().id],
+                "ingredients": [
+                    {"id": ingredient.id, "amount": 10}
+                    for ingredient in self.ingredients
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        detail = self.client.get(
+            reverse("api:recipes-detail", args=(response.json()["id"],))
+        )
+        self.assertEqual(response.json(), detail.json())
+
+    def test_repeated_ingredients_are_rejected(self):
+        ingredient = {"id": self.ingredients[0].id, "amount": 10}
+        response = self.client.post(
+            reverse("api:recipes-list"),
+            {
+                "name": "new",
+                "text": "text",
+                "cooking_time": 5,
+                "image": IMAGE_PAYLOAD,
+                "tags": [Tag.objects.first().id],
+                "ingredients": [ingredient, ingredient],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("ingredients", response.json())
+
+
+class ShoppingListTests(ResponseShapeTestCase):
+    def test_shopping_list(self):
+        response = self.client.get(
+            reverse("api:recipes-download-shopping-cart")
+        )
+        # Each cart recipe holds 100 of ingredients from its author's number
+        self.assertEqual(
+            b"".join(response),
+            "ingr0 - 100 г \ningr1 - 200 г \ningr2 - 300 г \n".encode(),
+        )
+
+    def download(self, **params):
+        return self.client.get(
+            reverse("api:recipes-download-shopping-cart"), params
+        )
+
+    def test_formats(self):
+        response = self.download(format="csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="shoplist.csv"',
+        )
+        self.assertEqual(
+            response.content.decode().splitlines(),
+            [
+                "name,measurement_unit,amount",
+                "ingr0,г,100",
+                "ingr1,г,200",
+                "ingr2,г,300",
+            ],
+        )
+        response = self.download(format="json")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(
+            response.json(),
+            [
+                {"name": f"ingr{i}", "measurement_unit": "г", "amount": amount}
+                for i, amount in enumerate((100, 200, 300))
+            ],
+        )
+        response = self.download(format="pdf")
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(response.content.startswith(b"%PDF"))
+
+    def test_repeat_download_is_cached(self):
+        first = self.download().content
+        with self.assertNumQueries(1):
+            # Only the cart ids for the digest
+            self.assertEqual(self.download().content, first)
+
+    def test_cart_change_gives_new_list(self):
+        self.download()
+        Purchase.objects.filter(
+            user=self.user, recipe__author=self.authors[0]
+        ).delete()
+        self.assertEqual(
+            self.download().content,
+            "ingr1 - 100 г \ningr2 - 200 г \n".encode(),
+        )
+
+    def test_recipe_edit_gives_new_list(self):
+        self.download()
+        recipe = Recipe.objects.get(name="author2 recipe0")
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientForRecipe.objects.filter(recipe=recipe).update(
+                amount=1
+            )
+            recipe.save()
+        self.assertEqual(
+            self.download().content,
+            "ingr0 - 100 г \ningr1 - 200 г \ningr2 - 201 г \n".encode(),
+        )
+
+    def test_ingredient_rename_gives_new_list(self):
+        self.download()
+        ingredient = self.ingredients[0]
+        ingredient.name = "renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.save()
+        self.assertEqual(
+            self.download().content,
+            "ingr1 - 200 г \ningr2 - 300 г \nrenamed - 100 г \n".encode(),
+        )
+
+
+class CatalogTests(ResponseShapeTestCase):
+    def test_catalogs(self):
+        for name, queryset, serializer_class in (
+            ("tags", Tag.objects.all(), TagSerializer),
+            ("ingredients", Ingredient.objects.all(), IngredientSerializer),
+        ):
+            with self.subTest(name):
+                response = self.client.get(reverse(f"api:{name}-list"))
+                self.assertEqual(
+                    json.loads(response.content),
+                    self.as_json(serializer_class(queryset, many=True).data),
+                )
+
+    def test_catalog_sees_bulk_loaded_tags(self):
+        url = reverse("api:tags-list")
+        self.assertEqual(len(json.loads(self.client.get(url).content)), 2)
+        # bulk_create sends no signals, the command bumps the version
+        call_command("load_tags")
+        self.assertEqual(len(json.loads(self.client.get(url).content)), 5)
+
+    def test_changes_wait_for_commit(self):
+        for name, model, fields in (
+            ("tags", Tag, {"slug": "new", "color": "#000010"}),
+            ("ingredients", Ingredient, {"measurement_unit": "г"}),
+        ):
+            with self.subTest(name):
+                version = get_version(name)
+                with self.captureOnCommitCallbacks() as callbacks:
+                    model.objects.create(name="new", **fields)
+                    self.assertEqual(get_version(name), version)
+                for callback in callbacks:
+                    callback()
+                self.assertGreater(get_version(name), version)
+
+    def test_if_none_match(self):
+        url = reverse("api:tags-list")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="new", slug="new", color="#000010")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since_in_the_same_second(self):
+        url = reverse("api:tags-list")
+        with mock.patch("recipes.catalogs.time") as clock:
+            clock.time.return_value = 1000.5
+            last_modified = self.client.get(url)["Last-Modified"]
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_304_NOT_MODIFIED
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                Tag.objects.create(name="new", slug="new", color="#000010")
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 3)
+
+
+class AutocompleteTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        # The index of this process outlives the rolled back test data
+        patcher = mock.patch.object(autocomplete, "_index", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ingredient_autocomplete(self):
+        for name in ("соль", "фасоль", "соль морская"):
+            Ingredient.objects.create(name=name, measurement_unit="г")
+        response = self.client.get(
+            reverse("api:ingredients-list"), {"name": "Соль"}
+        )
+        names = [ingredient["name"] for ingredient in response.json()]
+        # Prefix matches as before, substring matches ranked after them
+        self.assertEqual(names, ["соль", "соль морская", "фасоль"])
+
+    def test_index_follows_ingredient_changes(self):
+        url = reverse("api:ingredients-list")
+        Ingredient.objects.create(name="соль", measurement_unit="г")
+        self.assertEqual(len(self.client.get(url, {"name": "сол"}).json()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name="солод", measurement_unit="г")
+        self.assertEqual(len(self.client.get(url, {"name": "сол"}).json()), 2)
+
+    def test_prefix_index_ranking(self):
+        index = PrefixIndex(
+            [(1, "Фасоль"), (2, "Соль морская"), (3, "соль"), (4, "Солод")]
+        )
+        self.assertEqual(index.search(" СОЛЬ ", 10), [3, 2, 1])
+        self.assertEqual(index.search("соль", 2), [3, 2])
+        self.assertEqual(index.search("", 10), [])
+
+
+def image_payload(size=(64, 64), truncate=False):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, "PNG")
+    data = buffer.getvalue()
+    if truncate:
+        data = data[: len(data) // 2]
+    return "data:image/png;base64," + base64.b64encode(data).decode()
+
+
+@override_settings(RECIPE_IMAGE_WORKERS=0)
+class RecipeImageTests(TemporaryMediaMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user", email="user@ya.ru")
+        cls.tags = create_tags(1)
+        cls.ingredients = create_ingredients(1)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def payload(self, image, **fields):
+        return {
+            "name": "recipe",
+            "text": "text",
+            "cooking_time": 5,
+            "image": image,
+            "tags": [tag.id for tag in self.tags],
+            "ingredients": [
+                {"id": ingredient.id, "amount": 10}
+                for ingredient in self.ingredients
+            ],
+            **fields,
+        }
+
+    def create(self, image):
+        """Posts a recipe, returns its status before and after the job"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("api:recipes-list"), self.payload(image), format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(pk=response.json()["id"])
+        return response.json()["image_status"], recipe
+
+    def test_image_becomes_ready(self):
+        before, recipe = self.create(image_payload((2000, 1000)))
+        self.assertEqual(before, Recipe.IMAGE_PENDING)
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_READY)
+        for field, size in (
+            ("image", (1600, 800)),
+            ("list_thumbnail", (480, 240)),
+            ("detail_thumbnail", (960, 480)),
+        ):
+            with Image.open(getattr(recipe, field)) as image:
+                self.assertEqual(image.size, size)
+
+    def test_undecodable_pixels_fail(self):
+        with self.assertLogs("recipes.images", "WARNING"):
+            before, recipe = self.create(image_payload(truncate=True))
+        self.assertEqual(before, Recipe.IMAGE_PENDING)
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertFalse(recipe.image)
+
+    def test_non_images_are_rejected(self):
+        not_image = base64.b64encode(b"not an image").decode()
+        for image in ("###", not_image, f"data:image/png;base64,{not_image}"):
+            with self.subTest(image):
+                response = self.client.post(
+                    reverse("api:recipes-list"),
+                    self.payload(image),
+                    format="json",
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST
+                )
+                self.assertIn("image", response.json())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_edit_keeps_image_written_by_job(self):
+        _, stale = self.create(image_payload())
+        Recipe.objects.filter(pk=stale.pk).update(
+            image="recipe_images/other.jpg"
+        )
+        response = self.client.patch(
+            reverse("api:recipes-detail", args=(stale.pk,)),
+            self.payload(image_payload(), name="renamed"),
+            format="json",
+        )
+        self.assertEqual(response.json()["image_status"], Recipe.IMAGE_PENDING)
+        # An edit loaded before the job finished must not write the old
+        # image or status back
+        payload = self.payload(None, name="again")
+        del payload["image"]
+        serializer = AddRecipeSerializer(stale, data=payload, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        recipe = Recipe.objects.get(pk=stale.pk)
+        self.assertEqual(recipe.name, "again")
+        self.assertEqual(recipe.image.name, "recipe_images/other.jpg")
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_PENDING)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(path, name), self.media)
+            for path, _, names in os.walk(self.media)
+            for name in names
+        )
+
+    def test_base64_payload_is_staged(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                reverse("api:recipes-list"),
+                self.payload(image_payload()),
+                format="json",
+            )
+        recipe = Recipe.objects.get(pk=response.json()["id"])
+        self.assertTrue(recipe.image_upload.startswith(images.INCOMING_DIR))
+        self.assertEqual(self.stored_files(), [recipe.image_upload])
+        for callback in callbacks:
+            callback()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(recipe.image_upload, "")
+        self.assertEqual(len(self.stored_files()), 3)
+
+    def test_overtaken_job_keeps_newer_image(self):
+        with self.captureOnCommitCallbacks() as first_job:
+            response = self.client.post(
+                reverse("api:recipes-list"),
+                self.payload(image_payload((2000, 1000))),
+                format="json",
+            )
+        stale = Recipe.objects.get(pk=response.json()["id"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse("api:recipes-detail", args=(stale.pk,)),
+                self.payload(image_payload()),
+                format="json",
+            )
+        # The first job loaded its row before the edit and finishes last
+        with default_storage.open(stale.image_upload) as file:
+            images.save_recipe_image(stale, file)
+        for callback in first_job:
+            callback()
+        recipe = Recipe.objects.get(pk=stale.pk)
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_READY)
+        with Image.open(recipe.image) as image:
+            self.assertEqual(image.size, (64, 64))
+        self.assertEqual(
+            self.stored_files(),
+            sorted(
+                getattr(recipe, field).name
+                for field in ("image", "list_thumbnail", "detail_thumbnail")
+            ),
+        )
+
+    def test_lost_jobs_are_processed_by_command(self):
+        recipes = []
+        for name in ("lost", "unstaged"):
+            with self.captureOnCommitCallbacks():
+                response = self.client.post(
+                    reverse("api:recipes-list"),
+                    self.payload(image_payload(), name=name),
+                    format="json",
+                )
+            recipes.append(Recipe.objects.get(pk=response.json()["id"]))
+        default_storage.delete(recipes[1].image_upload)
+        call_command("process_pending_images", stdout=io.StringIO())
+        for recipe, image_status in zip(
+            recipes, (Recipe.IMAGE_READY, Recipe.IMAGE_FAILED)
+        ):
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.image_status, image_status)
+            self.assertEqual(recipe.image_upload, "")
+        self.assertFalse(
+            any(
+                name.startswith(images.INCOMING_DIR)
+                for name in self.stored_files()
+            )
+        )
+
+    def multipart_payload(self, ingredients):
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 64), "red").save(buffer, "JPEG")
+        payload = self.payload(
+            SimpleUploadedFile("photo.jpg", buffer.getvalue(), "image/jpeg"),
+            text="[Заметка] текст",
+            ingredients=ingredients,
+        )
+        payload["tags"] = [str(tag.id) for tag in self.tags]
+        return payload
+
+    def test_multipart_upload(self):
+        ingredients = json.dumps(
+            [{"id": self.ingredients[0].id, "amount": 10}]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("api:recipes-list"),
+                self.multipart_payload(ingredients),
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual(data["text"], "[Заметка] текст")
+        self.assertEqual(
+            [tag["id"] for tag in data["tags"]], [self.tags[0].id]
+        )
+        self.assertEqual(
+            [(item["id"], item["amount"]) for item in data["ingredients"]],
+            [(self.ingredients[0].id, 10)],
+        )
+        recipe = Recipe.objects.get(pk=data["id"])
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_READY)
+        with Image.open(recipe.image) as image:
+            self.assertEqual(image.size, (64, 64))
+        # The staged upload is removed once processed
+        self.assertEqual(
+            default_storage.listdir("recipe_images/incoming"), ([], [])
+        )
+
+    def test_multipart_malformed_json(self):
+        response = self.client.post(
+            reverse("api:recipes-list"),
+            self.multipart_payload('[{"id": 1, "amount": }]'),
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("ingredients", response.json()["detail"])
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(RECIPE_IMAGE_WORKERS=1, RECIPE_IMAGE_QUEUE_SIZE=1)
+    def test_full_queue_runs_job_inline(self):
+        started, release = threading.Event(), threading.Event()
+        threads = []
+
+        def blocking():
+            started.set()
+            release.wait(5)
+
+        with mock.patch.multiple(images, _executor=None, _queue_slots=None):
+            images.submit(blocking)
+            self.assertTrue(started.wait(5))
+            images.submit(lambda: threads.append(threading.current_thread()))
+            release.set()
+            images._executor.shutdown(wait=True)
+        self.assertEqual(threads, [threading.current_thread()])
+
+
+class RecipeSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username="author", email="author@ya.ru")
+        beet = Ingredient.objects.create(name="свёкла", measurement_unit="г")
+        for name, text in (
+            ("Борщ", "Густой суп"),
+            ("Винегрет", "Салат"),
+            ("Оладьи", "Завтрак"),
+        ):
+            ingredients = (beet,) if name != "Оладьи" else ()
+            recipe = create_recipe(
+                author, name, ingredients=ingredients, text=text
+            )
+            update_search_index(recipe)
+
+    def search(self, query):
+        response = self.client.get(
+            reverse("api:recipes-list"), {"search": query}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {recipe["name"] for recipe in response.data["results"]}
+
+    def test_search_name_text_and_ingredients(self):
+        self.assertEqual(self.search("борщ"), {"Борщ"})
+        self.assertEqual(self.search("суп"), {"Борщ"})
+        self.assertEqual(self.search("свёкла"), {"Борщ", "Винегрет"})
+        self.assertEqual(self.search("пицца"), set())
+
+
+class RecipeFilterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user", email="user@ya.ru")
+        cls.tags = create_tags(2)
+        cls.authors = [
+            User.objects.create(username=f"author{i}", email=f"a{i}@ya.ru")
+            for i in range(2)
+        ]
+        for author in cls.authors:
+            for i in range(2):
+                recipe = create_recipe(
+                    author, f"{author.username} recipe{i}", cls.tags
+                )
+                if i == 0:
+                    Favorite.objects.create(user=cls.user, recipe=recipe)
+
+    def filter(self, **params):
+        response = self.client.get(reverse("api:recipes-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe["name"] for recipe in response.data["results"]]
+
+    def test_filters_compose(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(
+            self.filter(is_favorited=1, author=self.authors[0].id),
+            ["author0 recipe0"],
+        )
+        self.assertEqual(len(self.filter(is_favorited=1)), 2)
+        self.assertEqual(len(self.filter(is_favorited=0)), 4)
+
+    def test_tags_filter_has_no_duplicates(self):
+        self.assertEqual(len(self.filter(tags=["tag0", "tag1"])), 4)
+
+    def test_anonymous_favorites_are_empty(self):
+        self.assertEqual(self.filter(is_favorited=1), [])
+
+
+class CounterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user", email="user@ya.ru")
+        cls.author = User.objects.create(
+            username="author", email="author@ya.ru"
+        )
+        cls.recipe = create_recipe(cls.author)
+
+    def test_counters_follow_writes(self):
+        self.client.force_authenticate(self.user)
+        for action in ("favorite", "shopping-cart"):
+            self.client.get(
+                reverse(f"api:recipes-{action}", args=(self.recipe.id,))
+            )
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.in_carts_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+
+        self.client.delete(
+            reverse("api:recipes-favorite", args=(self.recipe.id,))
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def test_counters_survive_patch(self):
+        """A favorite added while a PATCH is in flight is not lost"""
+        update = AddRecipeSerializer.update
+
+        def update_stale(serializer, instance, validated_data):
+            Favorite.objects.create(user=self.user, recipe=self.recipe)
+            return update(serializer, instance, validated_data)
+
+        ingredient = create_ingredients(1)[0]
+        self.client.force_authenticate(self.author)
+        with mock.patch.object(AddRecipeSerializer, "update", update_stale):
+            response = self.client.patch(
+                reverse("api:recipes-detail", args=(self.recipe.id,)),
+                {
+                    "name": "new name",
+                    "ingredients": [{"id": ingredient.id, "amount": 10}],
+                    "cooking_time": 5,
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["name"], "new name")
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_full_saves_keep_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.author.pk)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        create_recipe(self.author, "second")
+        recipe.name = "new name"
+        recipe.save()
+        author.set_password("new password")
+        author.save()
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.name, "new name")
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 2)
+
+    def test_saved_copies_are_inserted(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        recipe.pk = None
+        recipe.name = "copy"
+        recipe.save()
+        user = User.objects.get(pk=self.user.pk)
+        user.pk = None
+        user.username, user.email = "copy", "copy@ya.ru"
+        user.save()
+        self.assertEqual(Recipe.objects.filter(name="copy").count(), 1)
+        self.assertEqual(User.objects.filter(username="copy").count(), 1)
+        self.assertNotEqual(recipe.pk, self.recipe.pk)
+        self.assertNotEqual(user.pk, self.user.pk)
+
+    def test_reconcile_counters(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Recipe.objects.update(favorites_count=5, in_carts_count=2)
+        User.objects.update(recipes_count=0)
+        call_command("reconcile_counters", stdout=io.StringIO())
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.in_carts_count, 0)
+        self.assertEqual(self.author.recipes_count, 1)
+
+
+class RankingTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username="author", email="author@ya.ru")
+        cls.users = [
+            User.objects.create(username=f"user{i}", email=f"u{i}@ya.ru")
+            for i in range(3)
+        ]
+        cls.recipes = [create_recipe(author, f"recipe{i}") for i in range(3)]
+        # recipe0 was liked long ago, recipe1 just now
+        for user in cls.users:
+            Favorite.objects.create(user=user, recipe=cls.recipes[0])
+        Favorite.objects.filter(recipe=cls.recipes[0]).update(
+            date_added=timezone.now() - timedelta(days=30)
+        )
+        for user in cls.users[:2]:
+            Purchase.objects.create(user=user, recipe=cls.recipes[1])
+
+    def setUp(self):
+        cache.clear()
+
+    def ranking(self, name, params=None):
+        response = self.client.get(reverse(f"api:recipes-{name}"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe["name"] for recipe in response.data["results"]]
+
+    def test_popular_and_trending(self):
+        self.assertEqual(self.ranking("popular"), [])
+        call_command("refresh_rankings", stdout=io.StringIO())
+        self.assertEqual(self.ranking("popular"), ["recipe0", "recipe1"])
+        self.assertEqual(self.ranking("trending"), ["recipe1"])
+
+    def test_cursor_keeps_ranking(self):
+        call_command("refresh_rankings", stdout=io.StringIO())
+        self.assertEqual(
+            self.ranking("popular", {"cursor": ""}), ["recipe0", "recipe1"]
+        )
+
+    def test_incremental_refresh(self):
+        call_command("refresh_rankings", stdout=io.StringIO())
+        Favorite.objects.create(user=self.users[0], recipe=self.recipes[2])
+        stdout = io.StringIO()
+        call_command("refresh_rankings", stdout=stdout)
+        self.assertEqual(stdout.getvalue().strip(), "ranked 1 recipes")
+        self.assertEqual(self.ranking("trending"), ["recipe1", "recipe2"])
+
+
+class FeedTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user", email="user@ya.ru")
+        cls.authors = [
+            User.objects.create(username=f"author{i}", email=f"a{i}@ya.ru")
+            for i in range(2)
+        ]
+        for author in cls.authors:
+            create_recipe(author, f"{author.username} old")
+        Follow.objects.create(user=cls.user, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self):
+        response = self.client.get(reverse("api:recipes-feed"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe["name"] for recipe in response.data["results"]]
+
+    def test_feed_is_invalidated(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.feed(), ["author0 old"])
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.authors[0], "author0 new")
+        self.assertEqual(self.feed(), ["author0 new", "author0 old"])
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=self.user, author=self.authors[1])
+        self.assertEqual(len(self.feed()), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(user=self.user).delete()
+        self.assertEqual(self.feed(), [])
+
+    def test_feed_requires_authentication(self):
+        response = self.client.get(reverse("api:recipes-feed"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN output is SQLite's")
+class IndexUsageTests(APITestCase):
+    """Main endpoint queries are served by indexes, not table scans.
+
+    The SQL a request runs is captured and explained, so the filters,
+    Exists annotations and prefetches are checked as the views build them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user", email="user@ya.ru")
+        cls.author = User.objects.create(
+            username="author", email="author@ya.ru"
+        )
+        cls.recipe = create_recipe(
+            cls.author, "recipe", create_tags(2), create_ingredients(2)
+        )
+        Favorite.objects.create(user=cls.user, recipe=cls.recipe)
+        Purchase.objects.create(user=cls.user, recipe=cls.recipe)
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def explain(self, url, params=None):
+        """SQL and query plan of each query of a GET request"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                plan = "\n".join(row[-1] for row in cursor.fetchall())
+                plans.append((query["sql"], plan))
+        return plans
+
+    def assert_uses_indexes(self, url, params=None, ordered=True):
+        """No table scans, and no full index walks except for a page.
+
+        A page may walk an index in order until LIMIT rows are found,
+        counts of the paginator are cached. With ordered the rows must
+        come in index order; lists of one user's follows or purchases are
+        small and may be sorted instead.
+        """
+        plans = self.explain(url, params)
+        for sql, plan in plans:
+            with self.subTest(url=url, params=params, sql=sql, plan=plan):
+                self.assertNotRegex(plan, r"(?m)SCAN \S+$")
+                if " LIMIT " not in sql and "COUNT(*)" not in sql:
+                    self.assertNotIn("SCAN ", plan)
+                if ordered:
+                    self.assertNotIn("TEMP B-TREE", plan)
+        return plans
+
+    def test_recipe_list(self):
+        url = reverse("api:recipes-list")
+        for params in (
+            {},
+            {"page": 2, "limit": 1},
+            {"cursor": ""},
+            {"tags": ["tag0", "tag1"], "is_favorited": 1},
+            {"is_in_shopping_cart": 1},
+        ):
+            self.assert_uses_indexes(url, params)
+
+    def test_recipes_of_author(self):
+        plans = self.assert_uses_indexes(
+            reverse("api:recipes-list"), {"author": self.author.id}
+        )
+        self.assertTrue(
+            any(
+                "SEARCH recipes_recipe USING INDEX" in plan
+                and "(author_id=?)" in plan
+                for sql, plan in plans
+            )
+        )
+
+    def test_recipe_detail(self):
+        self.assert_uses_indexes(
+            reverse("api:recipes-detail", args=(self.recipe.id,))
+        )
+
+    def test_lists_of_user(self):
+        for url, params in (
+            (reverse("api:users-subscriptions"), {}),
+            (reverse("api:users-subscriptions"), {"recipes_limit": 1}),
+            (reverse("api:recipes-feed"), {}),
+            (reverse("api:recipes-download-shopping-cart"), {}),
+        ):
+            self.assert_uses_indexes(url, params, ordered=False)
+
+
+@override_settings(QUERY_INSTRUMENTATION=True)
+class InstrumentationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username="author", email="author@ya.ru")
+        for i in range(3):
+            create_recipe(author, f"recipe{i}")
+
+    def test_server_timing_and_log(self):
+        cache.clear()
+        with self.assertLogs("api.instrumentation", "INFO") as logs:
+            response = self.client.get(reverse("api:recipes-list"))
+        for metric in ("db", "view", "serialize", "render", "total"):
+            self.assertIn(f"{metric};dur=", response["Server-Timing"])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], reverse("api:recipes-list"))
+        self.assertEqual(record["queries"], response.instrumentation.queries)
+        self.assertEqual(record["duplicates"], {})
+
+    def test_repeated_queries_are_reported(self):
+        recorder = RequestRecorder()
+        with recorder.record_queries():
+            for recipe in Recipe.objects.all():
+                Favorite.objects.filter(recipe=recipe).exists()
+        self.assertEqual(recorder.queries, 4)
+        self.assertEqual(list(recorder.duplicates().values()), [3])
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s) LIMIT 21"),
+            "SELECT ? FROM t WHERE id IN (...) LIMIT ?",
+        )
+
+
+class BenchmarkCommandTests(APITestCase):
+    def test_seed_and_benchmark(self):
+        # Ids of a batch are looked up in several queries of LOOKUP_SIZE
+        with mock.patch(
+            "recipes.management.commands.seed_data.LOOKUP_SIZE", 7
+        ):
+            call_command(
+                "seed_data",
+                users=5,
+                recipes=30,
+                favorites=5,
+                purchases=5,
+                follows=5,
+                batch_size=20,
+                stdout=io.StringIO(),
+            )
+        self.assertEqual(Recipe.objects.count(), 30)
+        self.assertEqual(
+            Recipe.objects.filter(ingredientsforrecipe__isnull=True).count(), 0
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "result.json")
+            call_command(
+                "benchmark_api",
+                requests=2,
+                output=output,
+                stdout=io.StringIO(),
+            )
+            with open(output, encoding="utf-8") as file:
+                report = json.load(file)
+        self.assertEqual(report["rows"]["recipes"], 30)
+        for result in report["endpoints"].values():
+            self.assertEqual(result["errors"], 0)
+            self.assertGreater(result["queries"], 0)
+
+    def test_benchmark_requests_are_repeatable(self):
+        create_ingredients(50)
+        user = User.objects.create(username="user", email="user@ya.ru")
+        command = BenchmarkCommand()
+        self.assertEqual(
+            command.get_endpoints(user), command.get_endpoints(user)
+        )
+
+
+class QueryBudgetMixin:
+    """Pins the number of queries an endpoint runs at several sizes.
+
+    The count must stay within the budget and be the same for every
+    size, so a new per-row query fails the test.
+    """
+
+    sizes = (1, 5, 20)
+
+    def count_queries(
+        self, url, params=None, method="get", expected=status.HTTP_200_OK
+    ):
+        cache.clear()
+        kwargs = {} if method == "get" else {"format": "json"}
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, params, **kwargs)
+        self.assertEqual(response.status_code, expected, url)
+        return len(context)
+
+    def assert_counts(self, counts, budget, label):
+        self.assertLessEqual(max(counts.values()), budget, f"{label} {counts}")
+        self.assertEqual(
+            len(set(counts.values())), 1, f"{label} grows with size {counts}"
+        )
+
+    def assert_query_budget(
+        self, url, budget, params=None, size_param="limit", sizes=None
+    ):
+        counts = {
+            size: self.count_queries(url, {**(params or {}), size_param: size})
+            for size in sizes or self.sizes
+        }
+        self.assert_counts(counts, budget, url)
+
+
+class QueryBudgetTests(
+    TemporaryMediaMixin, QueryBudgetMixin, APITestCase
+):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user", email="user@ya.ru")
+        tags = create_tags(3)
+        ingredients = create_ingredients(3)
+        for i in range(20):
+            author = User.objects.create(
+                username=f"author{i}", email=f"author{i}@ya.ru"
+            )
+            Follow.objects.create(user=cls.user, author=author)
+            for j in range(2):
+                recipe = create_recipe(
+                    author, f"recipe{i}-{j}", tags, ingredients
+                )
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+                Purchase.objects.create(user=cls.user, recipe=recipe)
+        call_command("refresh_rankings", stdout=io.StringIO())
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def test_recipe_lists(self):
+        # page count, recipes, tags, ingredients and followed authors; the
+        # ranked lists also read their cached ids
+        for name, budget in (
+            ("list", 5),
+            ("feed", 6),
+            ("popular", 6),
+            ("trending", 6),
+        ):
+            with self.subTest(name):
+                self.assert_query_budget(
+                    reverse(f"api:recipes-{name}"), budget
+                )
+
+    def test_filtered_recipe_list(self):
+        # plus the lookup of the passed tag slugs
+        self.assert_query_budget(
+            reverse("api:recipes-list"),
+            6,
+            {"tags": ["tag0", "tag1"], "is_favorited": 1},
+        )
+
+    def sized_recipe(self, size):
+        """Recipe of a new author with size tags, ingredients and fans"""
+        author = User.objects.create(
+            username=f"sized{size}", email=f"sized{size}@ya.ru"
+        )
+        tags = [
+            Tag.objects.create(
+                name=f"sized{size}-{i}",
+                slug=f"sized{size}-{i}",
+                color=f"#{size:03d}{i:03d}",
+            )
+            for i in range(size)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f"sized{size}-{i}", measurement_unit="г"
+            )
+            for i in range(size)
+        ]
+        recipe = create_recipe(author, f"sized{size}", tags, ingredients)
+        for user in User.objects.exclude(pk=author.pk)[:size]:
+            Favorite.objects.create(user=user, recipe=recipe)
+            Purchase.objects.create(user=user, recipe=recipe)
+            Follow.objects.create(user=user, author=author)
+        return recipe
+
+    def test_recipe_detail(self):
+        recipes = {size: self.sized_recipe(size) for size in (1, 20)}
+        counts = {
+            size: self.count_queries(
+                reverse("api:recipes-detail", args=(recipe.id,))
+            )
+            for size, recipe in recipes.items()
+        }
+        self.assert_counts(counts, 5, "detail")
+        # The recipe and its author, the favorite and cart rows loaded for
+        # their signals, a delete per related table, the search index and
+        # the author's counter
+        deleted = {}
+        for size, recipe in recipes.items():
+            self.client.force_authenticate(recipe.author)
+            deleted[size] = self.count_queries(
+                reverse("api:recipes-detail", args=(recipe.id,)),
+                method="delete",
+                expected=status.HTTP_204_NO_CONTENT,
+            )
+        self.assert_counts(deleted, 12, "delete")
+
+    def test_recipe_writes(self):
+        # Validation (one lookup per tag, one for all ingredients), the
+        # write with bulk ingredient rows, counters and search index, then
+        # the reload for the response through the read plan
+        ingredients = create_ingredients(max(self.sizes))
+        tags = list(Tag.objects.values_list("id", flat=True))
+        created, updated = {}, {}
+        for size in self.sizes:
+            payload = {
+                "name": f"new{size}",
+                "text": "text",
+                "cooking_time": 5,
+                "image": IMAGE_PAYLOAD,
+                "tags": tags,
+                "ingredients": [
+                    {"id": ingredient.id, "amount": 10}
+                    for ingredient in ingredients[:size]
+                ],
+            }
+            created[size] = self.count_queries(
+                reverse("api:recipes-list"),
+                payload,
+                "post",
+                status.HTTP_201_CREATED,
+            )
+            recipe = Recipe.objects.get(name=f"new{size}")
+            for ingredient in payload["ingredients"]:
+                ingredient["amount"] = 20
+            updated[size] = self.count_queries(
+                reverse("api:recipes-detail", args=(recipe.id,)),
+                {"ingredients": payload["ingredients"], "cooking_time": 5},
+                "patch",
+            )
+        self.assert_counts(created, 19, "create")
+        self.assert_counts(updated, 20, "update")
+
+    def test_relation_writes(self):
+        # Adding: the target, the user and the target fields of the
+        # serializer, the unique check, the insert and, for recipes, the
+        # counter. Removing: the target, the row, the delete and the
+        # counter. Sizes are the rows other users already have
+        writes = (
+            ("api:recipes-favorite", Favorite, "recipe", 6, 4),
+            ("api:recipes-shopping-cart", Purchase, "recipe", 6, 4),
+            ("api:users-subscribe", Follow, "author", 5, 3),
+        )
+        for name, model, field, add_budget, remove_budget in writes:
+            added, removed = {}, {}
+            for size in self.sizes:
+                author = User.objects.create(
+                    username=f"{name}{size}", email=f"{size}@{name}.ru"
+                )
+                target = (
+                    author if field == "author" else create_recipe(author)
+                )
+                model.objects.bulk_create(
+                    model(user=user, **{field: target})
+                    for user in User.objects.exclude(pk=self.user.pk)[:size]
+                    if user != target
+                )
+                url = reverse(name, args=(target.pk,))
+                added[size] = self.count_queries(
+                    url, expected=status.HTTP_201_CREATED
+                )
+                removed[size] = self.count_queries(
+                    url, method="delete", expected=status.HTTP_204_NO_CONTENT
+                )
+            self.assert_counts(added, add_budget, f"{name} add")
+            self.assert_counts(removed, remove_budget, f"{name} remove")
+
+    def test_users(self):
+        # A page holding only the request user skips loading subscriptions
+        self.assert_query_budget(reverse("api:users-list"), 3, sizes=(5, 20))
+        self.assertEqual(self.count_queries(reverse("api:users-me")), 0)
+        authors = {size: self.sized_recipe(size).author for size in (1, 20)}
+        counts = {
+            size: self.count_queries(
+                reverse("api:users-detail", args=(author.id,))
+            )
+            for size, author in authors.items()
+        }
+        self.assert_counts(counts, 2, "detail")
+
+    def test_subscriptions(self):
+        url = reverse("api:users-subscriptions")
+        self.assert_query_budget(url, 3)
+        self.assert_query_budget(url, 3, {"limit": 20}, "recipes_limit")
+
+    def test_catalogs(self):
+        counts = {}
+        for size in (3, 20):
+            Tag.objects.bulk_create(
+                Tag(name=f"new{i}", slug=f"new{i}", color=f"#1000{i:02d}")
+                for i in range(Tag.objects.count(), size)
+            )
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f"ingr{i}", measurement_unit="г")
+                for i in range(Ingredient.objects.count(), size)
+            )
+            tag, ingredient = Tag.objects.last(), Ingredient.objects.last()
+            for label, url, params in (
+                ("tags", reverse("api:tags-list"), None),
+                ("tag", reverse("api:tags-detail", args=(tag.pk,)), None),
+                ("ingredients", reverse("api:ingredients-list"), None),
+                ("search", reverse("api:ingredients-list"), {"name": "ingr"}),
+                (
+                    "ingredient",
+                    reverse("api:ingredients-detail", args=(ingredient.pk,)),
+                    None,
+                ),
+            ):
+                # The autocomplete index of the process is built anew
+                with mock.patch.object(autocomplete, "_index", None):
+                    counts.setdefault(label, {})[size] = self.count_queries(
+                        url, params
+                    )
+        for label, budget in (
+            ("tags", 1),
+            ("tag", 1),
+            ("ingredients", 1),
+            ("search", 2),
+            ("ingredient", 1),
+        ):
+            with self.subTest(label):
+                self.assert_counts(counts[label], budget, label)
+
+    def test_download_shopping_cart(self):
+        url = reverse("api:recipes-download-shopping-cart")
+        counts = set()
+        for size in self.sizes:
+            Purchase.objects.filter(user=self.user).delete()
+            for recipe in Recipe.objects.all()[:size]:
+                Purchase.objects.create(user=self.user, recipe=recipe)
+            counts.add(self.count_queries(url))
+        self.assertEqual(len(counts), 1, counts)
+        self.assertLessEqual(counts.pop(), 2)
+
+
+class ConnectionTests(APITestCase):
+    def test_health_check_closes_dropped_connection(self):
+        settings_dict = {
+            **connection.settings_dict,
+            "CONN_HEALTH_CHECKS": True,
+        }
+        failures = stats["health_check_failures"]
+        with mock.patch.multiple(
+            connection,
+            settings_dict=settings_dict,
+            in_atomic_block=False,
+            is_usable=mock.DEFAULT,
+            close=mock.DEFAULT,
+        ) as mocks:
+            mocks["is_usable"].return_value = True
+            check_connection(connection)
+            mocks["close"].assert_not_called()
+            mocks["is_usable"].return_value = False
+            check_connection(connection)
+            mocks["close"].assert_called_once()
+        self.assertEqual(stats["health_check_failures"], failures + 1)
+
+    def test_health_check_runs_on_first_query(self):
+        settings_dict = {
+            **connection.settings_dict,
+            "CONN_MAX_AGE": 60,
+            "CONN_HEALTH_CHECKS": True,
+        }
+        self.addCleanup(vars(connection).pop, "ensure_connection", None)
+        with mock.patch.multiple(
+            connection,
+            settings_dict=settings_dict,
+            in_atomic_block=False,
+            is_usable=mock.DEFAULT,
+        ) as mocks:
+            check_connections()
+            # Nothing is checked for a request that makes no queries
+            mocks["is_usable"].assert_not_called()
+            for _ in range(2):
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            mocks["is_usable"].assert_called_once()
+            check_connections()
+            User.objects.exists()
+            self.assertEqual(mocks["is_usable"].call_count, 2)
+
+    def test_health_check_disabled(self):
+        with mock.patch.multiple(
+            connection, is_usable=mock.DEFAULT, close=mock.DEFAULT
+        ) as mocks:
+            check_connection(connection)
+            mocks["is_usable"].assert_not_called()
+
+    def test_metrics_for_admin_only(self):
+        url = reverse("api:metrics-db")
+        user = User.objects.create(username="user", email="user@ya.ru")
+        admin = User.objects.create(
+            username="admin", email="admin@ya.ru", is_staff=True
+        )
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        self.client.force_authenticate(user)
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_403_FORBIDDEN
+        )
+        self.client.force_authenticate(admin)
+        requests = stats["requests"]
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        metrics = response.json()
+        self.assertEqual(metrics["pid"], os.getpid())
+        self.assertEqual(metrics["pooler"], None)
+        self.assertGreater(metrics["worker"]["requests"], requests)
@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 
 from .views import (
     CustomUserViewSet,
+    DatabaseMetricsView,
     IngredientViewSet,
     RecipeViewSet,
     TagViewSet,
@@ -18,5 +19,8 @@ router.register("recipes", RecipeViewSet, basename="recipes")
 
 urlpatterns = [
     path("auth/", include("djoser.urls.authtoken")),
+    path(
+        "metrics/db/", DatabaseMetricsView.as_view(), name="metrics-db"
+    ),
     path("", include(router.urls)),
 ]
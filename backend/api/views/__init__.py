@@ -1,4 +1,5 @@
 from .ingredient_viewset import IngredientViewSet  # noqa
+from .metrics_view import DatabaseMetricsView  # noqa
 from .recipe_viewset import RecipeViewSet  # noqa
 from .tag_viewset import TagViewSet  # noqa
 from .user_viewset import CustomUserViewSet  # noqa
@@ -0,0 +1,14 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.connections import get_pool_metrics
+
+
+class DatabaseMetricsView(APIView):
+    """Connection reuse of the serving worker and pool state"""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_pool_metrics())
@@ -0,0 +1,82 @@
+from django.db.models import OuterRef, Prefetch, Subquery
+
+from recipes.models import IngredientForRecipe, Recipe
+
+
+class QueryPlan:
+    """Related lookups a serializer needs to avoid per-row queries"""
+
+    def __init__(self, select_related=(), prefetch_related=(), only=()):
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+        self.only = tuple(only)
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if not self.only:
+            return queryset
+        return queryset.only(*self.only)
+
+
+class QueryPlanMixin:
+    """Applies the query plan registered for the current viewset action"""
+
+    query_plans = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        plan = self.query_plans.get(self.action)
+        if plan is None:
+            return queryset
+        return plan.apply(queryset)
+
+
+# RecipeSerializer: author, tags and ingredient amounts with names.
+RECIPE_PLAN = QueryPlan(
+    select_related=("author",),
+    prefetch_related=(
+        "tags",
+        Prefetch(
+            "ingredientsforrecipe",
+            queryset=IngredientForRecipe.objects.select_related("ingredient"),
+        ),
+    ),
+)
+
+# BriefRecipeSerializer: only own columns.
+BRIEF_RECIPE_PLAN = QueryPlan(
+    only=(
+        "id",
+        "author_id",
+        "name",
+        "image",
+        "list_thumbnail",
+        "detail_thumbnail",
+        "cooking_time",
+        "pub_date",
+    ),
+)
+
+
+def get_subscriptions_plan(recipes_limit=None):
+    """FollowerSerializer: preview of each author's latest recipes.
+
+    With recipes_limit the preview is cut in the database by a correlated
+    subquery, so all authors of the page are served by one query.
+    """
+    recipes = BRIEF_RECIPE_PLAN.apply(Recipe.objects.all())
+    if recipes_limit is not None:
+        latest = Recipe.objects.filter(author_id=OuterRef("author_id"))
+        recipes = recipes.filter(
+            pk__in=Subquery(latest.values("pk")[:recipes_limit])
+        )
+    return QueryPlan(
+        prefetch_related=(
+            Prefetch(
+                "written_recipes", queryset=recipes, to_attr="preview_recipes"
+            ),
+        ),
+    )
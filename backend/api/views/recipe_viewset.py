@@ -1,26 +1,61 @@
+from django.db.models import Case, Exists, OuterRef, Value, When
 from django.http.response import HttpResponse
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from .query_plans import RECIPE_PLAN, QueryPlanMixin
+from api.feed import get_feed_ids
 from api.filters import RecipeFilter
+from api.parsers import MultiPartJSONParser
 from api.permissions import IsAuthorOrAdminOrReadOnly
+from api.renderers import SHOPPING_LIST_RENDERERS
 from api.serializers import (
     AddRecipeSerializer,
     FavoriteSerializer,
     PurchaseSerializer,
     RecipeSerializer,
 )
-from recipes.models import IngredientForRecipe, Purchase, Recipe
+from api.shopping_list import render_shopping_list
+from recipes.models import Favorite, Purchase, Recipe
+from recipes.rankings import get_ranked_ids
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     filterset_class = RecipeFilter
+    query_plans = {
+        "list": RECIPE_PLAN,
+        "retrieve": RECIPE_PLAN,
+        "popular": RECIPE_PLAN,
+        "trending": RECIPE_PLAN,
+        "feed": RECIPE_PLAN,
+    }
+    parser_classes = (JSONParser, MultiPartJSONParser)
+    multipart_json_fields = ("tags", "ingredients")
+    multipart_list_fields = ("tags",)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                Purchase.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+        )
 
     def get_serializer_class(self):
         if self.request.method in ("POST", "PUT", "PATCH"):
@@ -32,6 +67,47 @@ class RecipeViewSet(viewsets.ModelViewSet):
         context.update({"request": self.request})
         return context
 
+    def perform_create(self, serializer):
+        serializer.save()
+        serializer.instance = self.get_saved_recipe(serializer.instance)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        serializer.instance = self.get_saved_recipe(serializer.instance)
+
+    def get_saved_recipe(self, recipe):
+        """Written recipe reloaded with the flags and the read query plan"""
+        return RECIPE_PLAN.apply(self.get_queryset()).get(pk=recipe.pk)
+
+    def list_ids(self, ids):
+        """Recipes with the given ids in that order, filters still apply"""
+        if not ids:
+            queryset = self.get_queryset().none()
+        else:
+            rank = Case(
+                *(When(pk=pk, then=place) for place, pk in enumerate(ids))
+            )
+            queryset = (
+                self.filter_queryset(self.get_queryset())
+                .filter(pk__in=ids)
+                .order_by(rank)
+            )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def popular(self, request):
+        return self.list_ids(get_ranked_ids("popular"))
+
+    @action(detail=False)
+    def trending(self, request):
+        return self.list_ids(get_ranked_ids("trending"))
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        return self.list_ids(get_feed_ids(request.user))
+
     @action(detail=True, permission_classes=[IsAuthenticated], methods=["get"])
     def favorite(self, request, pk=None):
         user = request.user
@@ -82,33 +158,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, permission_classes=[IsAuthenticated])
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+    )
     def download_shopping_cart(self, request):
-        user = request.user
-        recipes = user.purchases.values_list("recipe", flat=True)
-        ingredients = IngredientForRecipe.objects.filter(
-            recipe__in=recipes
-        ).values_list(
-            "ingredient__name", "ingredient__measurement_unit", "amount"
+        renderer = request.accepted_renderer
+        content = render_shopping_list(request.user, renderer)
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        response = HttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="shoplist.{renderer.format}"'
         )
-        data = {}
-        for ingredient in ingredients:
-            name, measurement_unit, amount = ingredient
-            if name not in data:
-                data[name] = {
-                    "measurement_unit": measurement_unit,
-                    "amount": amount,
-                }
-            else:
-                data[name]["amount"] += amount
-
-        shopping_list = []
-        for item in data:
-            shopping_list.append(
-                f'{item} - {data[item]["amount"]} '
-                f'{data[item]["measurement_unit"]} \n'
-            )
-        response = HttpResponse(shopping_list, "Content-Type: text/plain")
-        response["Content-Disposition"] = 'attachment; filename="shoplist.txt"'
 
         return response
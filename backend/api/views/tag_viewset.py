@@ -1,12 +1,14 @@
 from rest_framework import viewsets
 from rest_framework.permissions import AllowAny
 
+from api.catalog import CatalogMixin
 from api.serializers import TagSerializer
 from recipes.models import Tag
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     permission_classes = (AllowAny,)
     pagination_class = None
+    catalog_name = "tags"
@@ -1,11 +1,13 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Value
 from djoser.views import UserViewSet
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from .query_plans import get_subscriptions_plan
 from api.serializers import FollowerSerializer, FollowSerializer
 from recipes.models import Follow
 
@@ -13,6 +15,18 @@ User = get_user_model()
 
 
 class CustomUserViewSet(UserViewSet):
+    cursor_ordering = ("id",)
+    recipes_limit_field = serializers.IntegerField(min_value=0)
+
+    def get_recipes_limit(self, request):
+        value = request.query_params.get("recipes_limit")
+        if value is None:
+            return None
+        try:
+            return self.recipes_limit_field.run_validation(value)
+        except serializers.ValidationError as error:
+            raise serializers.ValidationError({"recipes_limit": error.detail})
+
     @action(detail=True, permission_classes=[IsAuthenticated], methods=["get"])
     def subscribe(self, request, id=None):
         user = request.user
@@ -42,7 +56,13 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        recipes_limit = self.get_recipes_limit(request)
+        queryset = (
+            User.objects.filter(following__user=user)
+            .annotate(is_subscribed=Value(True))
+            .order_by("id")
+        )
+        queryset = get_subscriptions_plan(recipes_limit).apply(queryset)
         pages = self.paginate_queryset(queryset)
         serializer = FollowerSerializer(
             pages, many=True, context={"request": request}
@@ -7,6 +7,9 @@ SECRET_KEY = os.environ.get(
     "SECRET_KEY", "p&l%385148kslhtyn^##a1)ilz@4zqj=rq&agdol^##zgl9(vs"
 )
 DATA_UPLOAD_MAX_MEMORY_SIZE = 15_728_640
+FILE_UPLOAD_HANDLERS = [
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
 DEBUG = False
 
 ALLOWED_HOSTS = ["127.0.0.1", "localhost", "backend", "62.84.118.22"]
@@ -37,6 +40,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.instrumentation.QueryInstrumentationMiddleware",
 ]
 
 ROOT_URLCONF = "foodgram.urls"
@@ -58,6 +62,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "foodgram.wsgi.application"
+# "pgbouncer" when DB_HOST points to a pgbouncer in transaction mode
+DB_POOLER = os.environ.get("DB_POOLER", "")
 if os.environ.get("DB_ENGINE") == "django.db.backends.postgresql":
     DATABASES = {
         "default": {
@@ -67,6 +73,17 @@ if os.environ.get("DB_ENGINE") == "django.db.backends.postgresql":
             "PASSWORD": os.environ.get("POSTGRES_PASSWORD", "postgres"),
             "HOST": os.environ.get("DB_HOST", "db"),
             "PORT": os.environ.get("DB_PORT", 5432),
+            # Seconds a worker keeps its connection, 0 to close after
+            # every request
+            "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+            # Checked on the first query of each request, see
+            # api.connections
+            "CONN_HEALTH_CHECKS": (
+                os.environ.get("DB_CONN_HEALTH_CHECKS", "1") == "1"
+            ),
+            # Transaction pooling hands each transaction a different
+            # server connection, so cursors cannot outlive one
+            "DISABLE_SERVER_SIDE_CURSORS": DB_POOLER == "pgbouncer",
         }
     }
 else:
@@ -76,6 +93,20 @@ else:
             "NAME": BASE_DIR.parent / "db.sqlite3",
         }
     }
+
+# Catalog versions, feeds, rankings, page counts and shopping lists are
+# invalidated through the cache, so all workers must share it. LocMemCache
+# only suits a single process (runserver, tests); deployments use
+# memcached, see infra/docker-compose.yml.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",  # noqa
@@ -109,6 +140,35 @@ EMAIL_FILE_PATH = BASE_DIR / "sent_emails"
 
 ITEMS_PER_PAGE = 6
 
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+CATALOG_CACHE_TIMEOUT = 24 * 60 * 60
+INGREDIENT_AUTOCOMPLETE = True
+INGREDIENT_AUTOCOMPLETE_LIMIT = 20
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+PAGINATION_ESTIMATE_THRESHOLD = 10000
+RECIPE_TRENDING_DAYS = 7
+RECIPE_RANKING_SIZE = 100
+RECIPE_RANKING_CACHE_TIMEOUT = 60
+RECIPE_FEED_SIZE = 200
+RECIPE_FEED_CACHE_TIMEOUT = 15 * 60
+QUERY_INSTRUMENTATION = os.environ.get("QUERY_INSTRUMENTATION") == "1"
+QUERY_INSTRUMENTATION_SAMPLE_RATE = float(
+    os.environ.get("QUERY_INSTRUMENTATION_SAMPLE_RATE", 1)
+)
+QUERY_INSTRUMENTATION_DUPLICATES = 3
+SHOPPING_LIST_PDF_FONT = os.environ.get(
+    "SHOPPING_LIST_PDF_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+)
+
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "api.instrumentation": {"handlers": ["console"], "level": "INFO"},
+    },
+}
 
 REST_FRAMEWORK = {
     "COERCE_DECIMAL_TO_STRING": False,
@@ -137,6 +197,16 @@ DJOSER = {
 }
 
 
+RECIPE_IMAGE_FORMAT = "JPEG"
+RECIPE_IMAGE_QUALITY = 82
+RECIPE_IMAGE_MAX_SIZE = (1600, 1600)
+RECIPE_THUMBNAIL_SIZES = {
+    "list_thumbnail": (480, 480),
+    "detail_thumbnail": (960, 960),
+}
+RECIPE_IMAGE_WORKERS = int(os.environ.get("RECIPE_IMAGE_WORKERS", 2))
+RECIPE_IMAGE_QUEUE_SIZE = 16
+
 MEDIA_URL = "/backend_media/"
 MEDIA_ROOT = BASE_DIR / "backend_media"
 STATIC_URL = "/backend_static/"
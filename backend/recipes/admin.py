@@ -7,8 +7,10 @@ from .models import (
     IngredientForRecipe,
     Purchase,
     Recipe,
+    RecipeRanking,
     Tag,
 )
+from .search import update_search_index
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -29,15 +31,20 @@ class RecipeAdmin(admin.ModelAdmin):
         "author",
         "text",
         "is_favorited",
+        "in_carts_count",
         "cooking_time",
     )
     search_fields = ("name", "author", "text")
     list_filter = ("name", "author", "ingredients", "tags")
     empty_value_display = "-пусто-"
 
-    @staticmethod
-    def is_favorited(obj):
-        return obj.favorites.count()
+    @admin.display(description="в избранном", ordering="favorites_count")
+    def is_favorited(self, obj):
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_index(form.instance)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -64,9 +71,15 @@ class PurchaseAdmin(admin.ModelAdmin):
     empty_value_display = "-пусто-"
 
 
+class RecipeRankingAdmin(admin.ModelAdmin):
+    list_display = ("recipe", "popular_score", "trending_score", "computed_at")
+    readonly_fields = ("computed_at",)
+
+
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(Purchase, PurchaseAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(RecipeRanking, RecipeRankingAdmin)
@@ -0,0 +1,38 @@
+import math
+import time
+
+from django.core.cache import cache
+
+
+def version_key(name):
+    return f"catalog:{name}:version"
+
+
+def get_version(name):
+    """Second of the last change of the catalog, its Last-Modified.
+
+    Kept in the shared cache, so a change made by one worker or by a
+    management command reaches all workers.
+    """
+    return cache.get_or_set(
+        version_key(name), lambda: math.ceil(time.time()), None
+    )
+
+
+def invalidate_catalog(name):
+    """Move the version past both the previous one and the current second.
+
+    Every change gets a strictly larger version, even several in the same
+    second, so If-Modified-Since never matches a catalog built before the
+    change. The increments are atomic in the shared cache.
+    """
+    key = version_key(name)
+    now = math.ceil(time.time())
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        if cache.add(key, now, None):
+            return
+        version = cache.incr(key)
+    if version < now:
+        cache.incr(key, now - version)
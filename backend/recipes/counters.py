@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Favorite, Purchase, Recipe
+
+User = get_user_model()
+
+# model whose rows are counted: (counter model, foreign key, counter field)
+COUNTERS = {
+    Favorite: (Recipe, "recipe", "favorites_count"),
+    Purchase: (Recipe, "recipe", "in_carts_count"),
+    Recipe: (User, "author", "recipes_count"),
+}
+
+
+# Recipes being deleted, see deleting_recipe
+_deleted_recipes = ContextVar("deleted_recipes", default=frozenset())
+
+
+@contextmanager
+def deleting_recipe(recipe):
+    """Skip the counters of recipe while it is deleted.
+
+    Favorites and cart rows cascade with the recipe, each would update
+    the counters of a row that is deleted right after.
+    """
+    token = _deleted_recipes.set(_deleted_recipes.get() | {recipe.pk})
+    try:
+        yield
+    finally:
+        _deleted_recipes.reset(token)
+
+
+def change_counter(instance, delta):
+    """Add delta to the counter that instance's row is counted in"""
+    model, field, counter = COUNTERS[type(instance)]
+    pk = getattr(instance, f"{field}_id")
+    if model is Recipe and pk in _deleted_recipes.get():
+        return
+    model.objects.filter(pk=pk).update(
+        **{counter: Greatest(F(counter) + delta, Value(0))}
+    )
+
+
+def counted(source, field):
+    rows = (
+        source.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def reconcile_counters():
+    """Recompute drifted counters, return number of fixed rows per counter"""
+    fixed = {}
+    for source, (model, field, counter) in COUNTERS.items():
+        actual = counted(source, field)
+        fixed[counter] = (
+            model.objects.annotate(actual=actual)
+            .exclude(**{counter: F("actual")})
+            .update(**{counter: actual})
+        )
+    return fixed
@@ -0,0 +1,192 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp"}
+INCOMING_DIR = "recipe_images/incoming/"
+
+_executor = None
+_executor_lock = threading.Lock()
+_queue_slots = None
+
+
+def open_image(file):
+    """Decode image, apply EXIF orientation and drop alpha channel"""
+    image = Image.open(file)
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def encode_image(image, size):
+    """Shrink image to fit into size and recompress it"""
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        format=settings.RECIPE_IMAGE_FORMAT,
+        quality=settings.RECIPE_IMAGE_QUALITY,
+        optimize=True,
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def save_recipe_image(recipe, file):
+    """Store capped recipe image with list and detail thumbnails.
+
+    The row is only written while recipe.image_upload is still its job
+    token: a job overtaken by a newer upload removes its own files.
+    Files of the previous image are removed once the new ones are saved.
+    """
+    image = open_image(file)
+    name = uuid.uuid4().hex + EXTENSIONS[settings.RECIPE_IMAGE_FORMAT]
+    fields = ("image", *settings.RECIPE_THUMBNAIL_SIZES)
+    previous = [
+        (getattr(recipe, field).storage, getattr(recipe, field).name)
+        for field in fields
+        if getattr(recipe, field)
+    ]
+
+    recipe.image.save(
+        name,
+        encode_image(image, settings.RECIPE_IMAGE_MAX_SIZE),
+        save=False,
+    )
+    for field, size in settings.RECIPE_THUMBNAIL_SIZES.items():
+        getattr(recipe, field).save(
+            name, encode_image(image, size), save=False
+        )
+    saved = Recipe.objects.filter(
+        pk=recipe.pk, image_upload=recipe.image_upload
+    ).update(
+        image_status=Recipe.IMAGE_READY,
+        image_upload="",
+        **{field: getattr(recipe, field).name for field in fields},
+    )
+    if saved:
+        recipe.image_status = Recipe.IMAGE_READY
+        recipe.image_upload = ""
+    else:
+        previous = [
+            (getattr(recipe, field).storage, getattr(recipe, field).name)
+            for field in fields
+        ]
+    for storage, name in previous:
+        storage.delete(name)
+
+
+def process_image(recipe_id, name):
+    """Attach staged image to the recipe and remove the staged file.
+
+    name is the job token, nothing is done if the recipe is gone or
+    has a newer upload.
+    """
+    try:
+        recipe = Recipe.objects.filter(
+            pk=recipe_id, image_upload=name
+        ).first()
+        if recipe is None:
+            return
+        try:
+            with default_storage.open(name, "rb") as file:
+                save_recipe_image(recipe, file)
+        except (OSError, Image.DecompressionBombError):
+            logger.warning("Invalid image for recipe %s", recipe_id)
+            Recipe.objects.filter(pk=recipe_id, image_upload=name).update(
+                image_status=Recipe.IMAGE_FAILED, image_upload=""
+            )
+    finally:
+        default_storage.delete(name)
+
+
+def start_executor():
+    global _executor, _queue_slots
+    _executor = ThreadPoolExecutor(
+        max_workers=settings.RECIPE_IMAGE_WORKERS,
+        thread_name_prefix="recipe-images",
+    )
+    _queue_slots = threading.BoundedSemaphore(
+        settings.RECIPE_IMAGE_QUEUE_SIZE
+    )
+
+
+def get_executor():
+    with _executor_lock:
+        if _executor is None:
+            start_executor()
+    return _executor
+
+
+def run_in_worker(job, *args):
+    try:
+        job(*args)
+    except Exception:
+        logger.exception("Recipe image job failed")
+    finally:
+        _queue_slots.release()
+        close_old_connections()
+
+
+def submit(job, *args):
+    """Run job in the image pool.
+
+    With no workers configured, or when the queue is full, the job runs
+    in the calling thread, which throttles uploads instead of piling
+    decoded images up in memory.
+    """
+    if settings.RECIPE_IMAGE_WORKERS <= 0:
+        job(*args)
+        return
+    executor = get_executor()
+    if not _queue_slots.acquire(blocking=False):
+        job(*args)
+        return
+    executor.submit(run_in_worker, job, *args)
+
+
+def stage_image(image):
+    """Store image under recipe_images/incoming/ until its job is done.
+
+    image is either the bytes of a base64 payload or an uploaded file.
+    Staged files outlive the process, see the process_pending_images
+    command.
+    """
+    name = f"{INCOMING_DIR}{uuid.uuid4().hex}"
+    if isinstance(image, bytes):
+        return default_storage.save(name, ContentFile(image))
+    extension = os.path.splitext(image.name)[1].lower()
+    try:
+        return default_storage.save(f"{name}{extension}", image)
+    finally:
+        # The storage may have moved the temporary file away
+        image.close()
+
+
+def schedule_recipe_image(recipe, image):
+    """Stage image and process it once the recipe is committed.
+
+    Sets the pending status and the job token on recipe, the caller
+    saves them with the rest of its changes.
+    """
+    name = stage_image(image)
+    recipe.image_status = Recipe.IMAGE_PENDING
+    recipe.image_upload = name
+    transaction.on_commit(lambda: submit(process_image, recipe.pk, name))
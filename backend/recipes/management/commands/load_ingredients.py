@@ -3,6 +3,7 @@ import csv
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from recipes.catalogs import invalidate_catalog
 from recipes.models import Ingredient
 
 
@@ -18,3 +19,4 @@ class Command(BaseCommand):
                 for ingredient in ingredients_and_units
             )
             Ingredient.objects.bulk_create(bulk_create_ingredients)
+        invalidate_catalog("ingredients")
@@ -3,6 +3,7 @@ import csv
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from recipes.catalogs import invalidate_catalog
 from recipes.models import Tag
 
 
@@ -17,3 +18,4 @@ class Command(BaseCommand):
                 Tag(name=tag[0], color=tag[2], slug=tag[1]) for tag in tags
             )
             Tag.objects.bulk_create(bulk_create_tags)
+        invalidate_catalog("tags")
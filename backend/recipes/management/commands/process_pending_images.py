@@ -0,0 +1,24 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "processes images whose jobs were lost, e.g. on a restart"
+
+    def handle(self, *args, **options):
+        pending = Recipe.objects.filter(
+            image_status=Recipe.IMAGE_PENDING
+        ).exclude(image_upload="")
+        processed = failed = 0
+        for recipe_id, name in pending.values_list("id", "image_upload"):
+            if default_storage.exists(name):
+                process_image(recipe_id, name)
+                processed += 1
+            else:
+                failed += Recipe.objects.filter(
+                    pk=recipe_id, image_upload=name
+                ).update(image_status=Recipe.IMAGE_FAILED, image_upload="")
+        self.stdout.write(f"processed {processed}, staged file lost {failed}")
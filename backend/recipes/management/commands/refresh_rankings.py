@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipes.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = "recomputes popular and trending recipe rankings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="rank all recipes, not only the ones with new activity",
+        )
+
+    def handle(self, *args, **options):
+        ranked = refresh_rankings(full=options["full"])
+        self.stdout.write(f"ranked {ranked} recipes")
@@ -0,0 +1,214 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.counters import reconcile_counters
+from recipes.models import (
+    Favorite,
+    Follow,
+    Ingredient,
+    IngredientForRecipe,
+    Purchase,
+    Recipe,
+    Tag,
+)
+from recipes.rankings import refresh_rankings
+from recipes.search import rebuild_search_index
+
+User = get_user_model()
+
+PREFIX = "seed_"
+WORDS = (
+    "быстрый домашний пряный сытный лёгкий летний зимний праздничный "
+    "запечённый жареный тушёный суп салат пирог каша соус рагу"
+).split()
+# SQLite before 3.32 allows at most 999 parameters in a query
+LOOKUP_SIZE = 999
+
+
+@contextmanager
+def own_dates(*fields):
+    """Let bulk_create keep explicit values of auto_now_add fields"""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = "generates users, recipes and activity for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--recipes", type=int, default=100_000)
+        parser.add_argument("--favorites", type=int, default=50)
+        parser.add_argument("--purchases", type=int, default=10)
+        parser.add_argument("--follows", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="delete previously seeded users with all their data",
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        if options["clear"]:
+            User.objects.filter(username__startswith=PREFIX).delete()
+        if not Tag.objects.exists():
+            call_command("load_tags")
+        if not Ingredient.objects.exists():
+            call_command("load_ingredients")
+
+        with transaction.atomic():
+            users = self.create_users(options["users"])
+            recipes = self.create_recipes(users, options["recipes"])
+            self.create_activity(
+                Favorite, users, recipes, options["favorites"]
+            )
+            self.create_activity(
+                Purchase, users, recipes, options["purchases"]
+            )
+            self.create_follows(users, options["follows"])
+        reconcile_counters()
+        refresh_rankings(full=True)
+        rebuild_search_index()
+        self.stdout.write(
+            f"seeded {len(users)} users and {len(recipes)} recipes"
+        )
+
+    def past(self, days):
+        seconds = self.random.randint(0, days * 24 * 60 * 60)
+        return self.now - timedelta(seconds=seconds)
+
+    def sample(self, items, most):
+        return self.random.sample(
+            items, min(self.random.randint(0, most), len(items))
+        )
+
+    def create_users(self, count):
+        start = User.objects.filter(username__startswith=PREFIX).count()
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f"{PREFIX}{number}",
+                    email=f"{PREFIX}{number}@example.com",
+                    first_name="Тест",
+                    last_name=f"Пользователь {number}",
+                    password="!",
+                )
+                for number in range(start, start + count)
+            ),
+            batch_size=self.batch_size,
+        )
+        return list(
+            User.objects.filter(username__startswith=PREFIX).values_list(
+                "id", flat=True
+            )
+        )
+
+    def create_recipes(self, users, count):
+        ingredients = list(Ingredient.objects.values_list("id", "name"))
+        tags = list(Tag.objects.values_list("id", flat=True))
+        start = Recipe.objects.count()
+        recipes = []
+        for number in range(start, start + count):
+            name = " ".join(self.random.sample(WORDS, 3)).capitalize()
+            text = " ".join(self.random.choices(WORDS, k=30))
+            chosen = self.random.sample(
+                ingredients, self.random.randint(3, 10)
+            )
+            recipes.append(
+                (
+                    Recipe(
+                        name=f"{name} №{number}",
+                        author_id=self.random.choice(users),
+                        image="recipe_images/seed.jpg",
+                        text=text,
+                        cooking_time=self.random.randint(5, 180),
+                        pub_date=self.past(365),
+                        search_document="\n".join(
+                            (name, text, " ".join(n for _, n in chosen))
+                        ),
+                    ),
+                    chosen,
+                )
+            )
+        with own_dates(Recipe._meta.get_field("pub_date")):
+            for batch in batches(recipes, self.batch_size):
+                Recipe.objects.bulk_create(recipe for recipe, _ in batch)
+                names = [recipe.name for recipe, _ in batch]
+                ids = {}
+                for chunk in batches(names, LOOKUP_SIZE):
+                    ids.update(
+                        Recipe.objects.filter(name__in=chunk).values_list(
+                            "name", "id"
+                        )
+                    )
+                IngredientForRecipe.objects.bulk_create(
+                    IngredientForRecipe(
+                        recipe_id=ids[recipe.name],
+                        ingredient_id=ingredient,
+                        amount=self.random.randint(1, 500),
+                    )
+                    for recipe, chosen in batch
+                    for ingredient, _ in chosen
+                )
+                recipe_tag = Recipe.tags.through
+                recipe_tag.objects.bulk_create(
+                    recipe_tag(recipe_id=ids[recipe.name], tag_id=tag)
+                    for recipe, _ in batch
+                    for tag in self.random.sample(
+                        tags, self.random.randint(1, len(tags))
+                    )
+                )
+        return list(
+            Recipe.objects.filter(author_id__in=users).values_list(
+                "id", flat=True
+            )
+        )
+
+    def create_activity(self, model, users, recipes, per_user):
+        with own_dates(model._meta.get_field("date_added")):
+            model.objects.bulk_create(
+                (
+                    model(
+                        user_id=user,
+                        recipe_id=recipe,
+                        date_added=self.past(30),
+                    )
+                    for user in users
+                    for recipe in self.sample(recipes, per_user)
+                ),
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+
+    def create_follows(self, users, per_user):
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user, author_id=author)
+                for user in users
+                for author in self.sample(users, per_user)
+                if author != user
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_alter_follow_options'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipes_rec_slug_412256_idx',
+        ),
+        migrations.RemoveField(
+            model_name='recipe',
+            name='slug',
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipes_to_purchase', to='recipes.recipe', verbose_name='покупки'),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchases', to=settings.AUTH_USER_MODEL, verbose_name='покупатели'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_remove_recipe_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='detail_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='recipe_images/detail/', verbose_name='миниатюра для страницы рецепта'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='list_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='recipe_images/list/', verbose_name='миниатюра для списка'),
+        ),
+    ]
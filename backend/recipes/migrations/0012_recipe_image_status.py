@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'готово'), ('pending', 'обрабатывается'), ('failed', 'ошибка обработки')], default='ready', max_length=16, verbose_name='статус изображения'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, upload_to='recipe_images/', verbose_name='изображение'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:52
+
+from django.db import migrations, models
+
+FTS_TABLE = "recipes_recipe_fts"
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX recipes_recipe_search_gin ON recipes_recipe "
+            "USING gin (to_tsvector('russian'::regconfig, "
+            "COALESCE(search_document, '')))"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(document, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("DROP INDEX recipes_recipe_search_gin")
+    elif vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE {FTS_TABLE}")
+
+
+def fill_search_documents(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    sqlite = schema_editor.connection.vendor == "sqlite"
+    for recipe in Recipe.objects.prefetch_related("ingredients"):
+        ingredients = " ".join(i.name for i in recipe.ingredients.all())
+        document = "\n".join((recipe.name, recipe.text, ingredients))
+        Recipe.objects.filter(pk=recipe.pk).update(search_document=document)
+        if sqlite:
+            schema_editor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)",
+                [recipe.pk, document],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='текст для поиска'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+    ]
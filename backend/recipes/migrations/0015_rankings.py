@@ -0,0 +1,67 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models import OuterRef, Subquery
+
+
+def date_existing_favorites(apps, schema_editor):
+    """Real dates are unknown, the recipe's one keeps them out of trends"""
+    Favorite = apps.get_model("recipes", "Favorite")
+    Recipe = apps.get_model("recipes", "Recipe")
+    Favorite.objects.update(
+        date_added=Subquery(
+            Recipe.objects.filter(pk=OuterRef("recipe_id")).values(
+                "pub_date"
+            )[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeRanking',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='recipes.recipe', verbose_name='рецепт')),
+                ('popular_score', models.PositiveIntegerField(default=0, verbose_name='популярность')),
+                ('trending_score', models.PositiveIntegerField(default=0, verbose_name='активность за последние дни')),
+                ('computed_at', models.DateTimeField(verbose_name='дата расчёта')),
+            ],
+            options={
+                'verbose_name': 'рейтинг рецепта',
+                'verbose_name_plural': 'рейтинги рецептов',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='date_added',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(
+            date_existing_favorites, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['date_added'], name='recipes_fav_date_ad_27e94d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['date_added'], name='recipes_pur_date_ad_51ba31_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reciperanking',
+            index=models.Index(fields=['-popular_score'], name='recipes_rec_popular_c06b78_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reciperanking',
+            index=models.Index(fields=['-trending_score'], name='recipes_rec_trendin_752a65_idx'),
+        ),
+    ]
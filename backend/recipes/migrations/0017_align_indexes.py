@@ -0,0 +1,69 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0016_recipe_author_pub_date_index'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ingredientforrecipe',
+            name='unique_ingr_recipe',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipes_rec_pub_dat_caa7fa_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipes_rec_name_891f25_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='recipes_tag_slug_3ea026_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='recipes_tag_name_56fd94_idx',
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL, verbose_name='В избранном'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='user',
+            field=models.ForeignKey(db_index=False, help_text='Выберите пользователя', on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL, verbose_name='Подписанный'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientforrecipe',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ingredientsforrecipe', to='recipes.recipe', verbose_name='рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='purchases', to=settings.AUTH_USER_MODEL, verbose_name='покупатели'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='written_recipes', to=settings.AUTH_USER_MODEL, verbose_name='автор'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipes_rec_pub_dat_d83b61_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientforrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_ingr_recipe'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_align_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_upload',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='изображение в обработке'),
+        ),
+    ]
@@ -18,10 +18,6 @@ class Tag(models.Model):
     class Meta:
         verbose_name = "тэг"
         verbose_name_plural = "тэги"
-        indexes = [
-            models.Index(fields=["name"]),
-            models.Index(fields=["slug"]),
-        ]
 
     def __str__(self):
         return self.name
@@ -54,15 +50,50 @@ class Ingredient(models.Model):
 class Recipe(models.Model):
     """Model for recipes"""
 
+    IMAGE_READY = "ready"
+    IMAGE_PENDING = "pending"
+    IMAGE_FAILED = "failed"
+    IMAGE_STATUSES = (
+        (IMAGE_READY, "готово"),
+        (IMAGE_PENDING, "обрабатывается"),
+        (IMAGE_FAILED, "ошибка обработки"),
+    )
+
     name = models.CharField(verbose_name="название рецепта", max_length=128)
     author = models.ForeignKey(
         User,
         verbose_name="автор",
         on_delete=models.CASCADE,
         related_name="written_recipes",
+        db_index=False,
     )
     image = models.ImageField(
-        verbose_name="изображение", upload_to="recipe_images/"
+        verbose_name="изображение", upload_to="recipe_images/", blank=True
+    )
+    image_status = models.CharField(
+        verbose_name="статус изображения",
+        max_length=16,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY,
+    )
+    image_upload = models.CharField(
+        verbose_name="изображение в обработке",
+        max_length=255,
+        blank=True,
+        default="",
+        editable=False,
+    )
+    list_thumbnail = models.ImageField(
+        verbose_name="миниатюра для списка",
+        upload_to="recipe_images/list/",
+        blank=True,
+        editable=False,
+    )
+    detail_thumbnail = models.ImageField(
+        verbose_name="миниатюра для страницы рецепта",
+        upload_to="recipe_images/detail/",
+        blank=True,
+        editable=False,
     )
     text = models.TextField(verbose_name="текстовое описание")
     ingredients = models.ManyToManyField(
@@ -87,13 +118,25 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         verbose_name="дата создания", auto_now_add=True
     )
+    search_document = models.TextField(
+        verbose_name="текст для поиска",
+        blank=True,
+        default="",
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="в избранном", default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name="в списках покупок", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "рецепт"
         verbose_name_plural = "рецепты"
         indexes = [
-            models.Index(fields=["name"]),
-            models.Index(fields=["pub_date"]),
+            models.Index(fields=["-pub_date", "-id"]),
+            models.Index(fields=["author", "-pub_date", "-id"]),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -105,6 +148,30 @@ class Recipe(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The counters are changed by concurrent F() updates (see
+        # recipes.counters), a full-row save would write back stale values
+        if (
+            self.pk is not None
+            and not self._state.adding
+            and not kwargs.get("force_insert")
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ("favorites_count", "in_carts_count")
+            ]
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        # recipes.counters imports the models
+        from .counters import deleting_recipe
+
+        with deleting_recipe(self):
+            return super().delete(*args, **kwargs)
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(
@@ -112,6 +179,7 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         verbose_name="В избранном",
         related_name="favorites",
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -119,10 +187,15 @@ class Favorite(models.Model):
         verbose_name="Избранный рецепт",
         related_name="favorites",
     )
+    date_added = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата добавления",
+    )
 
     class Meta:
         verbose_name = "Избранный"
         verbose_name_plural = "Избранные"
+        indexes = [models.Index(fields=["date_added"])]
         constraints = [
             models.UniqueConstraint(
                 fields=["user", "recipe"],
@@ -142,6 +215,7 @@ class IngredientForRecipe(models.Model):
         verbose_name="рецепт",
         related_name="ingredientsforrecipe",
         on_delete=models.CASCADE,
+        db_index=False,
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -159,7 +233,7 @@ class IngredientForRecipe(models.Model):
     class Meta:
         constraints = [
             models.UniqueConstraint(
-                fields=("ingredient", "recipe"), name="unique_ingr_recipe"
+                fields=("recipe", "ingredient"), name="unique_ingr_recipe"
             )
         ]
         db_table = "foodgram_ingr_for_recipe"
@@ -176,6 +250,7 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name="follower",
         verbose_name="Подписанный",
+        db_index=False,
         help_text="Выберите пользователя",
     )
     author = models.ForeignKey(
@@ -206,6 +281,7 @@ class Purchase(models.Model):
         on_delete=models.CASCADE,
         verbose_name="покупатели",
         related_name="purchases",
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -222,6 +298,7 @@ class Purchase(models.Model):
         ordering = ("-date_added",)
         verbose_name = "Покупка"
         verbose_name_plural = "Покупки"
+        indexes = [models.Index(fields=["date_added"])]
         constraints = [
             models.UniqueConstraint(
                 fields=["user", "recipe"], name="unique_purchase_user_recipe"
@@ -230,3 +307,33 @@ class Purchase(models.Model):
 
     def __str__(self):
         return f"Рецепт {self.recipe} в списке покупок у {self.user}"
+
+
+class RecipeRanking(models.Model):
+    """Precomputed popularity of a recipe, see recipes.rankings"""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="рецепт",
+        related_name="ranking",
+    )
+    popular_score = models.PositiveIntegerField(
+        verbose_name="популярность", default=0
+    )
+    trending_score = models.PositiveIntegerField(
+        verbose_name="активность за последние дни", default=0
+    )
+    computed_at = models.DateTimeField(verbose_name="дата расчёта")
+
+    class Meta:
+        verbose_name = "рейтинг рецепта"
+        verbose_name_plural = "рейтинги рецептов"
+        indexes = [
+            models.Index(fields=["-popular_score"]),
+            models.Index(fields=["-trending_score"]),
+        ]
+
+    def __str__(self):
+        return f"Рейтинг рецепта {self.recipe_id}"
@@ -0,0 +1,114 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Favorite, Purchase, Recipe, RecipeRanking
+
+RANKINGS = {
+    "popular": "-popular_score",
+    "trending": "-trending_score",
+}
+
+
+def activity_since(model, since):
+    """Rows of model added for the outer recipe since the given moment"""
+    rows = (
+        model.objects.filter(recipe=OuterRef("pk"), date_added__gte=since)
+        .order_by()
+        .values("recipe")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def recipes_to_rank(now, window, full):
+    """Recipes whose ranking may have changed since the last refresh.
+
+    These are unranked recipes, recipes whose counters moved, and recipes
+    with activity that entered or left the trending window since then.
+    Removed favorites and purchases leave no trace, so trending scores
+    only catch up with them on a full refresh.
+    """
+    last = RecipeRanking.objects.aggregate(last=Max("computed_at"))["last"]
+    if full or last is None:
+        return Recipe.objects.all()
+    changed = Q(date_added__gte=last) | Q(
+        date_added__gte=last - window, date_added__lt=now - window
+    )
+    active = set(
+        Favorite.objects.filter(changed).values_list("recipe_id", flat=True)
+    )
+    active.update(
+        Purchase.objects.filter(changed).values_list("recipe_id", flat=True)
+    )
+    return Recipe.objects.filter(
+        Q(pk__in=active)
+        | Q(ranking__isnull=True)
+        | ~Q(
+            ranking__popular_score=F("favorites_count")
+            + F("in_carts_count")
+        )
+    )
+
+
+def refresh_rankings(full=False):
+    """Recompute rankings of changed recipes, return their number.
+
+    Popularity comes from the maintained counters, trending score is the
+    number of favorites and purchases within RECIPE_TRENDING_DAYS.
+    """
+    now = timezone.now()
+    window = timedelta(days=settings.RECIPE_TRENDING_DAYS)
+    rows = (
+        recipes_to_rank(now, window, full)
+        .annotate(
+            trending_score=activity_since(Favorite, now - window)
+            + activity_since(Purchase, now - window)
+        )
+        .values_list(
+            "pk", "favorites_count", "in_carts_count", "trending_score"
+        )
+    )
+    rankings = [
+        RecipeRanking(
+            recipe_id=pk,
+            popular_score=favorites + carts,
+            trending_score=trending,
+            computed_at=now,
+        )
+        for pk, favorites, carts, trending in rows
+    ]
+    stale = RecipeRanking.objects.all()
+    if not full:
+        stale = stale.filter(
+            recipe_id__in=[ranking.recipe_id for ranking in rankings]
+        )
+    with transaction.atomic():
+        stale.delete()
+        RecipeRanking.objects.bulk_create(rankings, batch_size=500)
+    for name in RANKINGS:
+        cache.delete(f"rankings:{name}")
+    return len(rankings)
+
+
+def get_ranked_ids(name):
+    """Ids of the top recipes of a ranking, cached for a short time"""
+    key = f"rankings:{name}"
+    ids = cache.get(key)
+    if ids is None:
+        order = RANKINGS[name]
+        ids = list(
+            RecipeRanking.objects.filter(**{f"{order[1:]}__gt": 0})
+            .order_by(order, "-recipe_id")
+            .values_list("recipe_id", flat=True)[
+                : settings.RECIPE_RANKING_SIZE
+            ]
+        )
+        cache.set(key, ids, settings.RECIPE_RANKING_CACHE_TIMEOUT)
+    return ids
@@ -0,0 +1,100 @@
+import re
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+FTS_TABLE = "recipes_recipe_fts"
+
+
+def build_document(recipe):
+    """Text indexed for recipe: name, description and ingredient names"""
+    ingredients = recipe.ingredients.values_list("name", flat=True)
+    return "\n".join((recipe.name, recipe.text, " ".join(ingredients)))
+
+
+def update_search_index(recipe):
+    """Refresh search document of a single recipe"""
+    document = build_document(recipe)
+    Recipe.objects.filter(pk=recipe.pk).update(search_document=document)
+    connection = connections[Recipe.objects.db]
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [recipe.pk]
+            )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)",
+                [recipe.pk, document],
+            )
+
+
+def remove_from_search_index(recipe):
+    connection = connections[Recipe.objects.db]
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [recipe.pk]
+            )
+
+
+def rebuild_search_index():
+    """Reload the SQLite FTS table from the stored search documents"""
+    connection = connections[Recipe.objects.db]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, document) "
+            f"SELECT id, search_document FROM {Recipe._meta.db_table}"
+        )
+
+
+def search_recipes(queryset, query):
+    """Filter queryset by full-text query, best matches first.
+
+    PostgreSQL uses the GIN index on the russian tsvector of
+    search_document, SQLite the FTS5 table. Other backends fall back to
+    icontains.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        from django.contrib.postgres.search import (
+            SearchQuery,
+            SearchRank,
+            SearchVector,
+        )
+
+        vector = SearchVector("search_document", config="russian")
+        search_query = SearchQuery(query, config="russian")
+        return (
+            queryset.annotate(search=vector)
+            .filter(search=search_query)
+            .annotate(search_rank=SearchRank(vector, search_query))
+            .order_by("-search_rank", "-pub_date")
+        )
+    if vendor == "sqlite":
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return queryset.none()
+        match = " ".join(f'"{term}"*' for term in terms)
+        return (
+            queryset.filter(
+                pk__in=RawSQL(
+                    f"SELECT rowid FROM {FTS_TABLE} "
+                    f"WHERE {FTS_TABLE} MATCH %s",
+                    [match],
+                )
+            )
+            .annotate(
+                search_rank=RawSQL(
+                    f"SELECT -rank FROM {FTS_TABLE} WHERE {FTS_TABLE} "
+                    f'MATCH %s AND rowid = "{Recipe._meta.db_table}"."id"',
+                    [match],
+                )
+            )
+            .order_by("-search_rank", "-pub_date")
+        )
+    return queryset.filter(search_document__icontains=query)
@@ -7,5 +7,24 @@ class User(AbstractUser):
     first_name = models.CharField(_("first name"), max_length=150)
     last_name = models.CharField(_("last name"), max_length=150)
     email = models.EmailField(_("email"), max_length=254, unique=True)
+    recipes_count = models.PositiveIntegerField(
+        _("recipes count"), default=0, editable=False
+    )
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ("username", "first_name", "last_name")
+
+    def save(self, *args, **kwargs):
+        # recipes_count is changed by F() updates only, keep it out of
+        # full-row saves such as profile or password changes
+        if (
+            self.pk is not None
+            and not self._state.adding
+            and not kwargs.get("force_insert")
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "recipes_count"
+            ]
+        super().save(*args, **kwargs)